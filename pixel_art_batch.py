@@ -0,0 +1,138 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from pixel_art_converter import convert_file
+from pixel_art_profile import measuring
+
+# Outcome of one file; size is the output resolution, error is None on success.
+# timings is the Timings record of the conversion when it was measured.
+BatchResult = namedtuple("BatchResult", ["input_path", "output_path", "size", "error", "timings"], defaults=(None,))
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def convert_job(job, options, profiling=None):
+    # Runs inside a worker process; exceptions are caught here so one bad
+    # file is reported instead of tearing down the whole pool
+    input_path, output_path = job
+    size = error = None
+    with measuring(profiling) as timings:
+        try:
+            size = convert_file(input_path, output_path, **options)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    return BatchResult(input_path, output_path, size, error, timings.record() if timings else None)
+
+def iter_convert_batch(jobs, options, workers=None, max_in_flight=None, profiling=None):
+    # Yields a BatchResult per job in completion order. At most max_in_flight
+    # jobs are submitted at once, so memory stays bounded however many files
+    # are queued.
+    workers = workers or default_workers()
+
+    if workers == 1:
+        for job in jobs:
+            yield convert_job(job, options, profiling)
+        return
+
+    max_in_flight = max(max_in_flight or workers * 4, workers)
+    jobs = iter(jobs)
+    # Jobs that were in flight when a worker died. Any of them may have killed
+    # it, so each is run again on its own; one that breaks the pool alone is
+    # reported as failed.
+    suspects = []
+    pending = {}
+    executor = ProcessPoolExecutor(max_workers=workers)
+
+    def fill():
+        # Top the queue up to the in-flight limit. Returns False if the pool
+        # turned out to be broken.
+        try:
+            if suspects:
+                if not pending:
+                    job = suspects.pop(0)
+                    pending[executor.submit(convert_job, job, options, profiling)] = job
+                return True
+            for job in jobs:
+                pending[executor.submit(convert_job, job, options, profiling)] = job
+                if len(pending) >= max_in_flight:
+                    break
+        except BrokenProcessPool:
+            suspects.insert(0, job)
+            return False
+        return True
+
+    try:
+        while True:
+            healthy = fill()
+            if not pending and healthy:
+                break
+            alone = len(pending) == 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                # Every other job of a broken pool fails too; collect them all
+                wait(pending)
+                done = list(pending)
+                healthy = False
+            for future in done:
+                input_path, output_path = job = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    yield future.result()
+                elif isinstance(error, BrokenProcessPool) and not alone:
+                    suspects.append(job)
+                else:
+                    # The worker itself died (e.g. killed for memory)
+                    yield BatchResult(input_path, output_path, None, f"{type(error).__name__}: {error}")
+            if not healthy:
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        executor.shutdown()
+
+def convert_batch(jobs, options, workers=None, max_in_flight=None, progress=None, cache=None, profiling=None):
+    # With a ResultCache, jobs whose result is cached are answered from it
+    # without being converted, and new results are added to it. With a
+    # Profiling setting, converted results carry their timings.
+    jobs = list(jobs)
+    total = len(jobs)
+    results = []
+
+    def finish(result):
+        results.append(result)
+        if progress:
+            progress(len(results), total, result)
+
+    keys = {}
+    pending = jobs
+    if cache is not None:
+        pending = []
+        for job in jobs:
+            input_path, output_path = job
+            try:
+                key = cache.key(input_path, output_path, options)
+            except (OSError, ValueError):
+                # Unreadable source or palette; converting it reports why
+                pending.append(job)
+                continue
+            size = cache.fetch(key, output_path)
+            if size:
+                finish(BatchResult(input_path, output_path, size, None))
+                continue
+            keys[job] = key
+            cache.release(output_path)
+            pending.append(job)
+
+    try:
+        for result in iter_convert_batch(pending, options, workers, max_in_flight, profiling):
+            key = keys.get((result.input_path, result.output_path))
+            if key and result.error is None:
+                cache.store(key, result.output_path, result.size)
+            finish(result)
+    finally:
+        # Also when the run is interrupted, so the results stored so far are
+        # remembered
+        if cache is not None:
+            cache.save()
+    return results
@@ -0,0 +1,412 @@
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+from PIL import Image, ImageDraw, ImageFilter
+import numpy as np
+
+from pixel_art_converter import load_image, convert_to_pixel_art
+from pixel_art_detect import detect_grid
+from pixel_art_output import save_image
+from pixel_art_palette import load_palette, palette_lut, quantize_array
+from pixel_art_sampling import SAMPLING_MODES, cell_edges
+from pixel_art_view import RenderCache, render_region
+
+# Bump when stages or inputs change so results of different versions are not compared
+BENCHMARK_VERSION = 3
+
+DEFAULT_SIZES = (512, 1024, 2048)
+DEFAULT_SCALES = (4, 7.5, 10.67)
+DEGRADATIONS = ('clean', 'jpeg')
+
+# Canvas size assumed for the viewport render stages
+VIEWPORT = (800, 600)
+
+# A cell counts as correct in a degraded image when no channel is further off
+NOISY_TOLERANCE = 24
+
+# Simultaneous clients for --server
+DEFAULT_CONCURRENCY = (1, 4, 16)
+
+# Latency percentiles reported for --server
+LATENCY_PERCENTILES = (50, 90, 99)
+
+def synthetic_sprite(width, height, seed=0, colors=12):
+    # Deterministic low-res "sprite": flat-colored rectangles and ellipses on a
+    # background, drawn from a small random palette
+    rng = np.random.default_rng(seed)
+    palette = [tuple(int(v) for v in color) for color in rng.integers(0, 256, (colors, 3))]
+    sprite = Image.new('RGB', (width, height), palette[0])
+    draw = ImageDraw.Draw(sprite)
+    for _ in range(max(4, width * height // 40)):
+        x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        x1 = min(width - 1, x0 + int(rng.integers(0, max(2, width // 4))))
+        y1 = min(height - 1, y0 + int(rng.integers(0, max(2, height // 4))))
+        fill = palette[int(rng.integers(1, colors))]
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=fill)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=fill)
+    return np.asarray(sprite)
+
+def upscale(sprite, scale):
+    # Nearest-neighbour upscale by a possibly fractional factor, the way AI
+    # upscalers lay out their cells: cell k covers the pixels whose centers
+    # fall in [k * scale, (k + 1) * scale), the convention the sampler uses at
+    # offset 0, so clean cases have an exact answer
+    height, width = sprite.shape[:2]
+    rows = np.minimum(((np.arange(int(height * scale)) + 0.5) / scale).astype(np.intp), height - 1)
+    cols = np.minimum(((np.arange(int(width * scale)) + 0.5) / scale).astype(np.intp), width - 1)
+    return sprite[rows[:, np.newaxis], cols]
+
+def encode_source(img_array, degradation):
+    # The source file as bytes: a lossless PNG, or blurred and JPEG-compressed
+    image = Image.fromarray(img_array)
+    buffer = io.BytesIO()
+    if degradation == 'jpeg':
+        image.filter(ImageFilter.GaussianBlur(0.6)).save(buffer, 'JPEG', quality=85)
+    else:
+        image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def measure(function, repeat, pixels):
+    # Best time of repeat runs, then one more traced run for peak memory.
+    # tracemalloc sees Python and NumPy allocations, not Pillow's own buffers.
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    stage = {'seconds': round(best, 6), 'peak_bytes': peak}
+    if pixels:
+        stage['mpix_per_s'] = round(pixels / best / 1e6, 2) if best > 0 else None
+    return stage, result
+
+def cell_accuracy(output, sprite, tolerance):
+    # Fraction of cells matching the sprite, over the cells both have
+    rows = min(output.shape[0], sprite.shape[0])
+    cols = min(output.shape[1], sprite.shape[1])
+    if rows == 0 or cols == 0:
+        return 0.0
+    diff = np.abs(output[:rows, :cols, :3].astype(np.int16) - sprite[:rows, :cols].astype(np.int16))
+    return round(float(np.mean(diff.max(axis=-1) <= tolerance)), 4)
+
+def run_case(size, scale, degradation, repeat, palette):
+    sprite = synthetic_sprite(max(2, int(size / scale)), max(2, int(size / scale)), seed=int(size * 100 + scale * 10))
+    data = encode_source(upscale(sprite, scale), degradation)
+    image = load_image(io.BytesIO(data))
+    image.load()
+    width, height = image.size
+    pixels = width * height
+    tolerance = 0 if degradation == 'clean' else NOISY_TOLERANCE
+    stages = {}
+    accuracy = {}
+
+    def load():
+        loaded = load_image(io.BytesIO(data))
+        loaded.load()
+        return loaded
+    stages['load'], _ = measure(load, repeat, pixels)
+
+    stages['detect'], detection = measure(lambda: detect_grid(image), repeat, pixels)
+    if detection is not None:
+        accuracy['detected_pitch'] = [round(detection.pitch_x, 3), round(detection.pitch_y, 3)]
+        accuracy['detected_offset'] = [round(detection.offset_x, 3), round(detection.offset_y, 3)]
+        accuracy['pitch_error'] = round(max(abs(detection.pitch_x - scale), abs(detection.pitch_y - scale)), 4)
+        accuracy['confidence'] = round(detection.confidence, 3)
+
+    outputs = {}
+    for sampling in SAMPLING_MODES:
+        stages[f'convert_{sampling}'], outputs[sampling] = measure(
+            lambda: convert_to_pixel_art(image, scale, sampling=sampling), repeat, pixels)
+        accuracy[f'cells_{sampling}'] = cell_accuracy(np.asarray(outputs[sampling]), sprite, tolerance)
+
+    source_array = np.asarray(image)
+    stages['quantize'], _ = measure(lambda: quantize_array(source_array, palette, use_lut=True), repeat, pixels)
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, 'output.png')
+        stages['encode'], _ = measure(lambda: save_image(outputs['center'], output_path), repeat,
+                                      outputs['center'].width * outputs['center'].height)
+
+    # Viewport renders as the GUI does them, each from a cold cache: the whole
+    # image fitted to the canvas, and a canvas-sized region at 4x
+    fit = min(VIEWPORT[0] / width, VIEWPORT[1] / height, 1.0)
+    fit_size = (max(1, int(width * fit)), max(1, int(height * fit)))
+    stages['render_fit'], _ = measure(
+        lambda: render_region(image, fit_size, (0, 0) + fit_size, Image.Resampling.LANCZOS, RenderCache()),
+        repeat, fit_size[0] * fit_size[1])
+    zoom_size = (int(width * fit * 4), int(height * fit * 4))
+    region = (zoom_size[0] // 4, zoom_size[1] // 4,
+              min(zoom_size[0], zoom_size[0] // 4 + VIEWPORT[0]), min(zoom_size[1], zoom_size[1] // 4 + VIEWPORT[1]))
+    stages['render_zoom'], _ = measure(
+        lambda: render_region(image, zoom_size, region, Image.Resampling.NEAREST, RenderCache()),
+        repeat, (region[2] - region[0]) * (region[3] - region[1]))
+
+    def grid_lines():
+        # Grid lines over the zoomed viewport, as the overlay computes them
+        zoom = zoom_size[0] / width
+        return (cell_edges(width, scale, 0, region[0] / zoom, region[2] / zoom),
+                cell_edges(height, scale, 0, region[1] / zoom, region[3] / zoom))
+    stages['grid_lines'], _ = measure(grid_lines, repeat, 0)
+
+    return {
+        'size': [width, height],
+        'scale': scale,
+        'degradation': degradation,
+        'stages': stages,
+        'accuracy': accuracy,
+    }
+
+def peak_rss():
+    # Peak resident memory of this process in bytes, where the platform tells
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def case_key(case):
+    if 'concurrency' in case:
+        return ('server', case['concurrency'])
+    return (case['size'][0], case['scale'], case['degradation'])
+
+def case_label(case):
+    if 'concurrency' in case:
+        return f"{case['concurrency']} clients"
+    return f"{case['size'][0]}px x{case['scale']} {case['degradation']}"
+
+def compare(results, baseline, tolerance):
+    # Stages that got slower than tolerance times their baseline time
+    slower = []
+    previous = {case_key(case): case for case in baseline.get('cases', [])}
+    for case in results['cases']:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        for name, stage in case['stages'].items():
+            old_stage = old['stages'].get(name)
+            if old_stage and old_stage['seconds'] > 0 and stage['seconds'] > old_stage['seconds'] * tolerance:
+                slower.append(f"{name} at {case_label(case)}: "
+                              f"{old_stage['seconds']:.4f}s -> {stage['seconds']:.4f}s")
+    return slower
+
+def inexact(results):
+    # Clean cases have an exact answer, so every cell must match in every mode
+    wrong = []
+    for case in results['cases']:
+        if case.get('degradation') != 'clean':
+            continue
+        for name, value in case['accuracy'].items():
+            if name.startswith('cells_') and value < 1.0:
+                wrong.append(f"{name} at {case_label(case)}: {value}")
+    return wrong
+
+def server_sources(sizes, scales, degradations):
+    # Uploads for --server, one per case, with the query that converts them
+    sources = []
+    for size in sizes:
+        for scale in scales:
+            for degradation in degradations:
+                sprite = synthetic_sprite(max(2, int(size / scale)), max(2, int(size / scale)),
+                                          seed=int(size * 100 + scale * 10))
+                sources.append((f"grid-size={scale:g}", encode_source(upscale(sprite, scale), degradation)))
+    return sources
+
+def load_server(url, sources, requests, concurrency):
+    # Sends requests uploads from concurrency client threads, each on its own
+    # keep-alive connection, and reports the latencies of successful ones.
+    # Requests the server turns away (503) are counted, not retried.
+    address = urlsplit(url)
+    latencies = []
+    statuses = {}
+    next_request = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection(address.hostname, address.port, timeout=300)
+        while True:
+            with lock:
+                index = next(next_request, None)
+            if index is None:
+                break
+            query, data = sources[index % len(sources)]
+            start = time.perf_counter()
+            try:
+                connection.request('POST', f"{address.path.rstrip('/')}/convert?{query}", body=data)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if response.will_close:
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                status = None
+                connection.close()
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    stages = {}
+    if latencies:
+        # Reported like stages so --baseline compares them too
+        for percentile in LATENCY_PERCENTILES:
+            stages[f'latency_p{percentile}'] = {'seconds': round(float(np.percentile(latencies, percentile)), 6)}
+        stages['latency_max'] = {'seconds': round(max(latencies), 6)}
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'ok': statuses.get(200, 0),
+        'rejected': statuses.get(503, 0),
+        'failed': requests - statuses.get(200, 0) - statuses.get(503, 0),
+        'seconds': round(seconds, 6),
+        'requests_per_s': round(len(latencies) / seconds, 2) if seconds > 0 else None,
+        'stages': stages,
+    }
+
+def run_server_benchmark(args):
+    # Latency and throughput of the HTTP service at each --concurrency, against
+    # --url or a server started in this process
+    sources = server_sources(args.sizes, args.scales, args.degradations)
+    server = pool = None
+    url = args.url
+    if url is None:
+        from pixel_art_server import WorkerPool, ConversionServer, served_palettes
+        palettes = served_palettes([])
+        workers = args.workers or os.cpu_count() or 1
+        pool = WorkerPool(workers, palettes.values())
+        server = ConversionServer(('127.0.0.1', 0), pool, palettes, workers * 4, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        # One unmeasured pass so every upload has been seen once
+        load_server(url, sources, len(sources), 1)
+        cases = []
+        for concurrency in args.concurrency:
+            case = load_server(url, sources, args.requests, concurrency)
+            latency = case['stages'].get('latency_p50', {}).get('seconds', 0)
+            print(f"{concurrency} clients: {case['requests_per_s']} requests/s, p50 {latency * 1000:.1f}ms, "
+                  f"{case['rejected']} rejected, {case['failed']} failed", file=sys.stderr)
+            cases.append(case)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            pool.close()
+    return cases
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pixel_art_benchmark",
+        description="Time the conversion pipeline on deterministic synthetic pixel art and report JSON."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Source image sizes in pixels (default: 512 1024 2048)")
+    parser.add_argument("--scales", type=float, nargs="+", default=list(DEFAULT_SCALES),
+                        help="Upscale factors of the synthetic sprites (default: 4 7.5 10.67)")
+    parser.add_argument("--degradations", nargs="+", choices=DEGRADATIONS, default=list(DEGRADATIONS),
+                        help="Source variants: lossless PNG, or blurred JPEG (default: both)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per stage; the best time is kept (default: 3)")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of to stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against; exit 1 on slowdowns")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="With --baseline, stages slower than this factor count as regressions (default: 1.25)")
+    parser.add_argument("--server", action="store_true",
+                        help="Measure request latency and throughput of the HTTP service instead of the pipeline stages")
+    parser.add_argument("--url", help="With --server, the running service to load (default: start one in this process)")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="With --server, worker processes of the started service (default: number of CPUs)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY),
+                        help="With --server, numbers of simultaneous clients to measure (default: 1 4 16)")
+    parser.add_argument("--requests", type=int, default=100,
+                        help="With --server, requests sent at each concurrency (default: 100)")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        args.repeat = 1
+
+    if args.server:
+        if (args.workers is not None and args.workers < 1) or min(args.concurrency) < 1 or args.requests < 1:
+            parser.error("--workers, --concurrency and --requests must be at least 1")
+        cases = run_server_benchmark(args)
+    else:
+        # The palette table is built once up front; quantization timings are for mapping only
+        palette = load_palette('pico8')
+        palette_lut(palette)
+
+        cases = []
+        for size in args.sizes:
+            for scale in args.scales:
+                for degradation in args.degradations:
+                    case = run_case(size, scale, degradation, args.repeat, palette)
+                    print(f"{size}px x{scale:g} {degradation}: "
+                          + ", ".join(f"{name} {stage['seconds'] * 1000:.1f}ms" for name, stage in case['stages'].items()),
+                          file=sys.stderr)
+                    cases.append(case)
+
+    results = {
+        'version': BENCHMARK_VERSION,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+        'machine': platform.machine(),
+        'peak_rss_bytes': peak_rss(),
+        'cases': cases,
+    }
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    wrong = inexact(results)
+    for line in wrong:
+        print(f"inexact: {line}", file=sys.stderr)
+
+    slower = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('version') != BENCHMARK_VERSION:
+            print(f"baseline is from benchmark version {baseline.get('version')}, not {BENCHMARK_VERSION}; "
+                  "not compared", file=sys.stderr)
+        else:
+            slower = compare(results, baseline, args.tolerance)
+            for line in slower:
+                print(f"slower: {line}", file=sys.stderr)
+    return 1 if wrong or slower else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
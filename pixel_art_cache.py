@@ -0,0 +1,197 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from pixel_art_palette import default_cache_dir, load_palette, palette_key
+
+# Bump when a change to the conversion alters its output, so results made by
+# older versions are not reused
+CACHE_VERSION = 3
+
+# Default size cap of the result cache
+DEFAULT_CACHE_BYTES = 1 << 30
+
+# Options that never change the output and so are not part of the key
+NEUTRAL_OPTIONS = ('strip_rows',)
+
+HASH_CHUNK = 1 << 20
+
+# Files in the cache directory that no saved index lists are only deleted
+# once they are this old, so results of a run that is still going (and has
+# not saved its index yet) survive another run's pruning
+UNKNOWN_FILE_AGE = 24 * 60 * 60
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def options_key(options):
+    # Conversion options as a canonical string. Palettes count by their colors,
+    # so editing a palette file invalidates the results made with it.
+    options = {name: value for name, value in options.items() if name not in NEUTRAL_OPTIONS}
+    if options.get('palette'):
+        options['palette'] = palette_key(load_palette(options['palette']))
+    return json.dumps(options, sort_keys=True)
+
+def place(source, target):
+    # Make target a hard link to source, or a copy where linking is not
+    # possible; the target appears atomically
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, target)
+
+class ResultCache:
+    # Converted images keyed by a hash of the source bytes, the conversion
+    # options and the output format, with least-recently-used eviction once
+    # the cache outgrows max_bytes.
+    #
+    # The index remembers each source's size and mtime next to its hash, so
+    # unchanged files are not read again. It is used from one process per
+    # run (the one handing out batch jobs); save() merges it with the index
+    # other runs saved in the meantime.
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory or os.path.join(default_cache_dir(), 'results')
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.sources, self.entries = self.read_index()
+
+    def read_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get('version') == CACHE_VERSION:
+                return index['sources'], index['entries']
+        except (OSError, ValueError, KeyError):
+            pass  # Missing or damaged index; start empty
+        return {}, {}
+
+    def source_digest(self, file_path):
+        # Content hash of a source, only re-read when its size or mtime changed
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        known = self.sources.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        digest = file_digest(file_path)
+        self.sources[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def key(self, input_path, output_path, options):
+        extension = os.path.splitext(output_path)[1].lower()
+        text = f"{CACHE_VERSION}\n{self.source_digest(input_path)}\n{options_key(options)}\n{extension}"
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def entry_path(self, key, extension):
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def fetch(self, key, output_path):
+        # Put the cached result for key at output_path and return its size,
+        # or None if there is none
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        path = self.entry_path(key, entry['extension'])
+        try:
+            if not (os.path.exists(output_path) and os.path.samefile(path, output_path)):
+                place(path, output_path)
+        except OSError:
+            # Removed from the cache directory behind our back
+            del self.entries[key]
+            return None
+        entry['used'] = time.time()
+        return tuple(entry['size'])
+
+    def release(self, output_path):
+        # An output that is a hard link to a cache entry must not be written
+        # in place, or the entry would change with it
+        try:
+            if os.stat(output_path).st_nlink > 1:
+                os.unlink(output_path)
+        except OSError:
+            pass
+
+    def store(self, key, output_path, size):
+        extension = os.path.splitext(output_path)[1].lower()
+        path = self.entry_path(key, extension)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            place(output_path, path)
+            nbytes = os.path.getsize(path)
+        except OSError:
+            return
+        self.entries[key] = {'size': list(size), 'bytes': nbytes, 'used': time.time(), 'extension': extension}
+
+    def prune(self):
+        # Drop the least recently used results until the cache fits, and
+        # files no index knows about once they are old enough
+        total = sum(entry['bytes'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda key: self.entries[key]['used']):
+            if total <= self.max_bytes:
+                break
+            entry = self.entries.pop(key)
+            total -= entry['bytes']
+            try:
+                os.unlink(self.entry_path(key, entry['extension']))
+            except OSError:
+                pass
+
+        known = {key + entry['extension'] for key, entry in self.entries.items()}
+        cutoff = time.time() - UNKNOWN_FILE_AGE
+        for directory, _, names in os.walk(self.directory):
+            if directory == self.directory:
+                continue
+            for name in names:
+                if name not in known:
+                    path = os.path.join(directory, name)
+                    try:
+                        if os.path.getmtime(path) < cutoff:
+                            os.unlink(path)
+                    except OSError:
+                        pass
+
+    @contextlib.contextmanager
+    def locked(self):
+        # Serializes saving between runs sharing the cache directory where the
+        # platform has flock; elsewhere the last run to save may drop entries
+        # of a run saving at the same moment
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with open(os.path.join(self.directory, 'index.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self.locked():
+                # Entries other runs saved since this one started are kept;
+                # for results both know, the later use counts
+                sources, entries = self.read_index()
+                sources.update(self.sources)
+                for key, entry in self.entries.items():
+                    if key not in entries or entries[key]['used'] < entry['used']:
+                        entries[key] = entry
+                self.sources, self.entries = sources, entries
+                self.prune()
+
+                temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump({'version': CACHE_VERSION, 'sources': self.sources, 'entries': self.entries}, f)
+                os.replace(temp_path, self.index_path)
+        except OSError:
+            pass  # Read-only cache; results are simply not remembered
@@ -1,540 +1,428 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageTk, ImageDraw
-import numpy as np
+import argparse
+import glob
+import math
 import os
+import sys
 
-class PixelArtConverter:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("AI Pixel Art Converter")
-        self.root.geometry("1200x800")
-        
-        # Variables
-        self.original_image = None
-        self.display_image = None
-        self.photo = None
-        self.grid_size = None
-        self.grid_offset_x = 0
-        self.grid_offset_y = 0
-        self.corner_points = []
-        self.grid_overlay = None
-        self.is_drawing_grid = False
-        
-        # Zoom variables
-        self.zoom_level = 1.0
-        self.pan_x = 0
-        self.pan_y = 0
-        self.is_panning = False
-        self.last_pan_x = 0
-        self.last_pan_y = 0
-        
-        self.setup_ui()
-        
-    def setup_ui(self):
-        # Main frame
-        main_frame = ttk.Frame(self.root)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # Left panel for controls
-        left_panel = ttk.Frame(main_frame, width=200)
-        left_panel.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
-        
-        # Right panel for image display
-        right_panel = ttk.Frame(main_frame)
-        right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
-        
-        # Control buttons
-        ttk.Button(left_panel, text="Open Image", command=self.open_image).pack(fill=tk.X, pady=5)
-        ttk.Button(left_panel, text="Select Pixel Corners", command=self.start_corner_selection).pack(fill=tk.X, pady=5)
-        ttk.Button(left_panel, text="Clear Selection", command=self.clear_selection).pack(fill=tk.X, pady=5)
-        ttk.Button(left_panel, text="Process Image", command=self.process_image).pack(fill=tk.X, pady=5)
-        ttk.Button(left_panel, text="Save Result", command=self.save_result).pack(fill=tk.X, pady=5)
-        
-        # Zoom controls
-        zoom_frame = ttk.LabelFrame(left_panel, text="Zoom Controls")
-        zoom_frame.pack(fill=tk.X, pady=10)
-        
-        zoom_buttons_frame = ttk.Frame(zoom_frame)
-        zoom_buttons_frame.pack(fill=tk.X, pady=5)
-        
-        ttk.Button(zoom_buttons_frame, text="Zoom In", command=self.zoom_in).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 2))
-        ttk.Button(zoom_buttons_frame, text="Zoom Out", command=self.zoom_out).pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=(2, 0))
-        
-        ttk.Button(zoom_frame, text="Reset Zoom", command=self.reset_zoom).pack(fill=tk.X, pady=2)
-        ttk.Button(zoom_frame, text="Fit to Window", command=self.fit_to_window).pack(fill=tk.X, pady=2)
-        
-        # Status label
-        self.status_label = ttk.Label(left_panel, text="No image loaded", wraplength=180)
-        self.status_label.pack(fill=tk.X, pady=10)
-        
-        # Instructions
-        instructions = """
-Instructions:
-1. Open an AI-generated image
-2. Use zoom controls to get a close view
-3. Click "Select Pixel Corners"
-4. Click two corners of what looks like a pixel
-5. Click "Process Image" to convert
-6. Save the result
-
-Zoom Controls:
-• Zoom In/Out buttons or mouse wheel
-• Right-click and drag to pan
-• Middle-click to reset zoom
-• "Fit to Window" to reset view
-        """
-        ttk.Label(left_panel, text=instructions, wraplength=180, justify=tk.LEFT).pack(fill=tk.X, pady=10)
-        
-        # Create a frame for the canvas and scrollbars
-        canvas_frame = ttk.Frame(right_panel)
-        canvas_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # Image display area
-        self.canvas = tk.Canvas(canvas_frame, bg="white", cursor="cross")
-        self.canvas.grid(row=0, column=0, sticky="nsew")
-        
-        # Scrollbars
-        h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
-        v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
-        h_scrollbar.grid(row=1, column=0, sticky="ew")
-        v_scrollbar.grid(row=0, column=1, sticky="ns")
-        
-        # Configure grid weights
-        canvas_frame.grid_rowconfigure(0, weight=1)
-        canvas_frame.grid_columnconfigure(0, weight=1)
-        
-        self.canvas.configure(xscrollcommand=h_scrollbar.set, yscrollcommand=v_scrollbar.set)
-        
-        # Bind mouse events
-        self.canvas.bind("<Button-1>", self.on_canvas_click)
-        self.canvas.bind("<Motion>", self.on_canvas_motion)
-        self.canvas.bind("<Button-3>", self.start_pan)  # Right click to start panning
-        self.canvas.bind("<B3-Motion>", self.pan)  # Right click drag to pan
-        self.canvas.bind("<ButtonRelease-3>", self.stop_pan)  # Release right click to stop panning
-        self.canvas.bind("<MouseWheel>", self.on_mousewheel)  # Mouse wheel to zoom
-        self.canvas.bind("<Button-2>", self.on_middle_click)  # Middle click to reset zoom
-        
-    def open_image(self):
-        file_path = filedialog.askopenfilename(
-            title="Select Image",
-            filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp *.gif *.tiff")]
-        )
-        
-        if file_path:
-            try:
-                self.original_image = Image.open(file_path)
-                
-                # Convert to RGBA if it has transparency, RGB otherwise
-                if self.original_image.mode in ('RGBA', 'LA', 'P'):
-                    # Handle images with transparency
-                    if self.original_image.mode == 'P':
-                        self.original_image = self.original_image.convert('RGBA')
-                    elif self.original_image.mode == 'LA':
-                        # Convert LA to RGBA
-                        rgb_image = self.original_image.convert('RGB')
-                        alpha = self.original_image.split()[-1]
-                        self.original_image = Image.merge('RGBA', (*rgb_image.split(), alpha))
-                else:
-                    # Convert to RGB for images without transparency
-                    self.original_image = self.original_image.convert('RGB')
-                
-                self.display_image = self.original_image.copy()
-                self.update_display()
-                self.status_label.config(text=f"Loaded: {os.path.basename(file_path)}")
-                self.clear_selection()
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not open image: {str(e)}")
-    
-    def update_display(self):
-        if self.display_image:
-            # Calculate display size to fit in canvas
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            
-            if canvas_width <= 1 or canvas_height <= 1:
-                # Canvas not yet sized, use default
-                canvas_width, canvas_height = 800, 600
-            
-            # Calculate base scale to fit image in canvas
-            img_width, img_height = self.display_image.size
-            scale_x = canvas_width / img_width
-            scale_y = canvas_height / img_height
-            base_scale = min(scale_x, scale_y, 1.0)  # Don't scale up
-            
-            # Apply zoom level
-            scale = base_scale * self.zoom_level
-            
-            # Resize for display
-            display_width = int(img_width * scale)
-            display_height = int(img_height * scale)
-            
-            # Handle transparent images properly for display (white background for viewing)
-            if self.display_image.mode == 'RGBA':
-                # Create a white background for transparent images (for display only)
-                background = Image.new('RGB', (display_width, display_height), (255, 255, 255))
-                
-                # Use faster resampling for better performance
-                resampling = Image.Resampling.NEAREST if self.zoom_level >= 2.0 else Image.Resampling.LANCZOS
-                resized_image = self.display_image.resize((display_width, display_height), resampling)
-                
-                # Composite the transparent image onto white background
-                background.paste(resized_image, (0, 0), resized_image)
-                self.display_image_resized = background
-            else:
-                # Use faster resampling for better performance
-                resampling = Image.Resampling.NEAREST if self.zoom_level >= 2.0 else Image.Resampling.LANCZOS
-                self.display_image_resized = self.display_image.resize((display_width, display_height), resampling)
-            
-            self.photo = ImageTk.PhotoImage(self.display_image_resized)
-            
-            # Update canvas
-            self.canvas.delete("all")
-            
-            # Apply pan offset
-            x_offset = self.pan_x
-            y_offset = self.pan_y
-            
-            self.canvas.create_image(x_offset, y_offset, anchor=tk.NW, image=self.photo)
-            
-            # Set proper scroll region to include the entire image area
-            scroll_left = min(0, x_offset)
-            scroll_top = min(0, y_offset)
-            scroll_right = max(canvas_width, x_offset + display_width)
-            scroll_bottom = max(canvas_height, y_offset + display_height)
-            
-            self.canvas.configure(scrollregion=(scroll_left, scroll_top, scroll_right, scroll_bottom))
-            
-            # Store scale for coordinate conversion
-            self.scale_factor = scale
-    
-    def start_corner_selection(self):
-        if not self.original_image:
-            messagebox.showwarning("Warning", "Please open an image first")
-            return
-        
-        self.is_drawing_grid = True
-        self.corner_points = []
-        self.status_label.config(text="Click two corners of a pixel")
-        self.canvas.config(cursor="crosshair")
-    
-    def on_canvas_click(self, event):
-        if not self.is_drawing_grid or not self.original_image:
-            return
-        
-        # Convert canvas coordinates to image coordinates (accounting for pan and zoom)
-        # First, convert from canvas coordinates to image coordinates
-        canvas_x = event.x - self.pan_x
-        canvas_y = event.y - self.pan_y
-        
-        # Then convert to actual image coordinates
-        x = int(canvas_x / self.scale_factor)
-        y = int(canvas_y / self.scale_factor)
-        
-        # Ensure coordinates are within image bounds
-        img_width, img_height = self.original_image.size
-        x = max(0, min(x, img_width - 1))
-        y = max(0, min(y, img_height - 1))
-        
-        self.corner_points.append((x, y))
-        
-        # Draw point on canvas at the actual click position
-        self.canvas.create_oval(event.x-3, event.y-3, event.x+3, event.y+3, 
-                              fill="red", outline="red", tags="selection")
-        
-        if len(self.corner_points) == 2:
-            self.create_grid()
-            self.is_drawing_grid = False
-            self.canvas.config(cursor="")
-            self.status_label.config(text="Grid created. Click 'Process Image' to convert.")
-    
-    def on_canvas_motion(self, event):
-        if self.is_drawing_grid and len(self.corner_points) == 1:
-            # Show preview line
-            self.canvas.delete("preview")
-            x1, y1 = self.corner_points[0]
-            # Convert first point back to canvas coordinates
-            canvas_x1 = int(x1 * self.scale_factor) + self.pan_x
-            canvas_y1 = int(y1 * self.scale_factor) + self.pan_y
-            # Draw line from first point to current mouse position
-            self.canvas.create_line(canvas_x1, canvas_y1, event.x, event.y, 
-                                  fill="red", dash=(5, 5), tags="preview")
-    
-    def create_grid(self):
-        if len(self.corner_points) != 2:
-            return
-        
-        # Calculate grid size and offset
-        x1, y1 = self.corner_points[0]
-        x2, y2 = self.corner_points[1]
-        
-        # Calculate the diagonal distance
-        dx = abs(x2 - x1)
-        dy = abs(y2 - y1)
-        self.grid_size = max(dx, dy)  # Use the larger dimension as grid size
-        
-        if self.grid_size < 2:
-            messagebox.showwarning("Warning", "Grid size too small. Please select points further apart.")
-            self.clear_selection()
-            return
-        
-        # Calculate grid offset based on the first point
-        # This ensures the grid aligns with the pixel boundaries you selected
-        self.grid_offset_x = x1 % self.grid_size
-        self.grid_offset_y = y1 % self.grid_size
-        
-        # Create grid overlay
-        self.draw_grid_overlay()
-    
-    def draw_grid_overlay(self):
-        if not self.original_image or not self.grid_size:
-            return
-        
-        img_width, img_height = self.original_image.size
-        
-        # Create grid overlay image
-        self.grid_overlay = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(self.grid_overlay)
-        
-        # Optimize grid drawing by limiting the number of lines for large images
-        max_lines = 100  # Limit to prevent excessive drawing
-        
-        # Draw vertical grid lines with offset
-        x_lines = 0
-        for x in range(self.grid_offset_x, img_width, self.grid_size):
-            if x_lines >= max_lines:
-                break
-            draw.line([(x, 0), (x, img_height)], fill=(255, 0, 0, 128), width=1)
-            x_lines += 1
-        
-        # Draw horizontal grid lines with offset
-        y_lines = 0
-        for y in range(self.grid_offset_y, img_height, self.grid_size):
-            if y_lines >= max_lines:
-                break
-            draw.line([(0, y), (img_width, y)], fill=(255, 0, 0, 128), width=1)
-            y_lines += 1
-        
-        # Overlay grid on display image
-        self.display_image = self.original_image.copy()
-        self.display_image.paste(self.grid_overlay, (0, 0), self.grid_overlay)
-        self.update_display()
-    
-    def clear_selection(self):
-        self.corner_points = []
-        self.grid_size = None
-        self.grid_offset_x = 0
-        self.grid_offset_y = 0
-        self.grid_overlay = None
-        self.is_drawing_grid = False
-        self.canvas.delete("all")
-        self.canvas.config(cursor="")
-        
-        if self.original_image:
-            self.display_image = self.original_image.copy()
-            self.update_display()
-        
-        self.status_label.config(text="Selection cleared")
-    
-    def process_image(self):
-        if not self.original_image or not self.grid_size:
-            messagebox.showwarning("Warning", "Please select pixel corners first")
-            return
-        
-        try:
-            # Show processing status
-            self.status_label.config(text="Processing image...")
-            self.root.update()
-            
-            # Convert to pixel art
-            pixel_art = self.convert_to_pixel_art()
-            
-            # Display result
-            self.display_image = pixel_art
-            self.update_display()
-            
-            # Show resolution information
-            original_width, original_height = self.original_image.size
-            pixel_width, pixel_height = pixel_art.size
-            self.status_label.config(text=f"Converted: {original_width}x{original_height} → {pixel_width}x{pixel_height}")
-            messagebox.showinfo("Success", f"Image converted to pixel art!\nResolution: {original_width}x{original_height} → {pixel_width}x{pixel_height}")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error processing image: {str(e)}")
-            self.status_label.config(text="Processing failed")
-    
-    def convert_to_pixel_art(self):
-        if not self.original_image or not self.grid_size:
-            return None
-        
-        # Keep original image mode for transparency preservation
-        original_mode = self.original_image.mode
-        img_array = np.array(self.original_image)
-        
-        img_height, img_width = img_array.shape[:2]
-        
-        # Calculate effective image area after offset
-        effective_width = img_width - self.grid_offset_x
-        effective_height = img_height - self.grid_offset_y
-        
-        # Calculate number of grid cells
-        grid_cols = effective_width // self.grid_size
-        grid_rows = effective_height // self.grid_size
-        
-        # Optimize for large images by using vectorized operations
-        if grid_rows * grid_cols > 10000:  # For very large grids, use numpy operations
-            # Create coordinate arrays
-            col_coords = np.arange(grid_cols) * self.grid_size + self.grid_offset_x + self.grid_size // 2
-            row_coords = np.arange(grid_rows) * self.grid_size + self.grid_offset_y + self.grid_size // 2
-            
-            # Ensure coordinates are within bounds
-            col_coords = np.clip(col_coords, 0, img_width - 1)
-            row_coords = np.clip(row_coords, 0, img_height - 1)
-            
-            # Use advanced indexing for faster sampling
-            output_array = img_array[row_coords[:, np.newaxis], col_coords]
+from PIL import Image
+import numpy as np
+
+from pixel_art_detect import detect_grid, grid_from_detection
+from pixel_art_output import OUTPUT_FORMATS, DEFAULT_COMPRESS_LEVEL, save_image
+from pixel_art_palette import BUILTIN_PALETTES, load_palette, adaptive_palette, quantize_array, palette_lut
+from pixel_art_profile import (TIMINGS_ENV, PROFILE_ENV, TIMING_FORMATS, PROFILERS, Profiling, TimingSummary,
+                               jsonl_line, stage)
+from pixel_art_sampling import SAMPLING_MODES, sample_grid
+
+# Extensions picked up when a directory is given on the command line
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff')
+
+# What becomes of images with several frames (animated GIF/PNG, multi-page
+# TIFF): an animation in the output format, a sheet of all converted frames,
+# or only the first frame
+FRAME_MODES = ('animation', 'sheet', 'first')
+
+# Rows copied per step by image_array
+ARRAY_BAND_ROWS = 256
+
+def normalized_mode(mode):
+    # Mode every image is converted to before sampling
+    return 'RGBA' if mode in ('RGBA', 'LA', 'P') else 'RGB'
+
+def normalize_image(image):
+    # Convert to RGBA if it has transparency, RGB otherwise. Images already in
+    # that mode are returned as they are rather than copied, and LA and P are
+    # converted in one step.
+    mode = normalized_mode(image.mode)
+    if image.mode == mode:
+        return image
+    return image.convert(mode)
+
+def open_unchecked(file_path):
+    # Image.open without Pillow's decompression bomb check, for callers that
+    # only read the header or decode the pixels a strip at a time. Anything
+    # that decodes the whole image uses Image.open and keeps the check.
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        return Image.open(file_path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+def load_image(file_path):
+    with stage('decode'):
+        image = Image.open(file_path)
+        image.load()
+    with stage('normalize'):
+        return normalize_image(image)
+
+def image_array(image):
+    # The pixels of image as a new array. np.asarray(image) goes through a
+    # bytes object that Pillow joins from a list of chunks, briefly holding
+    # three copies of a big image; copying a band of rows at a time holds
+    # little more than the image and the array.
+    width, height = image.size
+    if height <= ARRAY_BAND_ROWS:
+        return np.asarray(image)
+    first = np.asarray(image.crop((0, 0, width, ARRAY_BAND_ROWS)))
+    img_array = np.empty((height,) + first.shape[1:], dtype=first.dtype)
+    img_array[:ARRAY_BAND_ROWS] = first
+    for top in range(ARRAY_BAND_ROWS, height, ARRAY_BAND_ROWS):
+        img_array[top:top + ARRAY_BAND_ROWS] = np.asarray(image.crop((0, top, width, min(height, top + ARRAY_BAND_ROWS))))
+    return img_array
+
+def grid_pitch(grid_size):
+    # grid_size is either one cell size or a (width, height) pair for non-square cells
+    if isinstance(grid_size, (tuple, list)):
+        return grid_size[0], grid_size[1]
+    return grid_size, grid_size
+
+def apply_palette(output_array, palette=None, colors=None):
+    # Optional limited palette: a fixed one (name, file or Palette) or an
+    # adaptive one of `colors` colors picked from the sampled result
+    if palette is not None:
+        if isinstance(palette, str):
+            palette = load_palette(palette)
+        return quantize_array(output_array, palette)
+    if colors:
+        return quantize_array(output_array, adaptive_palette(output_array, colors), use_lut=False)
+    return output_array
+
+def convert_to_pixel_art(image, grid_size, grid_offset_x=0, grid_offset_y=0, sampling='center',
+                         palette=None, colors=None, progress=None):
+    # progress, if given, is called with the fraction of the grid sampled so
+    # far; an exception raised from it stops the conversion
+    if image is None or not grid_size:
+        return None
+
+    with stage('to_array'):
+        img_array = image_array(image)
+
+    # Keep original image mode for transparency preservation
+    return convert_array(img_array, image.mode, grid_size, grid_offset_x, grid_offset_y, sampling,
+                         palette, colors, progress)
+
+def convert_array(img_array, mode, grid_size, grid_offset_x=0, grid_offset_y=0, sampling='center',
+                  palette=None, colors=None, progress=None):
+    # convert_to_pixel_art for pixels that are already an array, which is
+    # only read, never copied as a whole
+    pitch_x, pitch_y = grid_pitch(grid_size)
+
+    # One vectorized pass over the whole grid, whatever its size
+    with stage('sample'):
+        output_array = sample_grid(img_array, pitch_x, pitch_y, grid_offset_x, grid_offset_y, sampling, progress)
+
+    with stage('palette'):
+        output_array = apply_palette(output_array, palette, colors)
+
+    # Convert back to PIL Image with original mode to preserve transparency
+    with stage('from_array'):
+        pixel_art = Image.fromarray(output_array, mode=mode)
+
+    # Return the pixel art at its true resolution (no scaling)
+    # Each pixel in the output represents one grid cell from the original
+    return pixel_art
+
+def detect_grid_checked(image, min_confidence=0.0):
+    # Automatic grid for unattended runs; refuses to guess below min_confidence
+    with stage('detect'):
+        detection = detect_grid(image)
+    if detection is None:
+        raise ValueError("no pixel grid found")
+    if detection.confidence < min_confidence:
+        raise ValueError(f"grid detection confidence {detection.confidence:.2f} is below {min_confidence:.2f}")
+    return grid_from_detection(detection)
+
+def convert_file(input_path, output_path, grid_size, grid_offset_x=0, grid_offset_y=0, min_confidence=0.0,
+                 sampling='center', palette=None, colors=None, strip_rows=None, frames='animation',
+                 compress_level=DEFAULT_COMPRESS_LEVEL, scale=1):
+    # Returns the size of the written image (of one frame for animations)
+    if frames != 'first':
+        # All frames share one grid and are sampled together
+        from pixel_art_frames import frame_count, convert_animation
+        if frame_count(input_path) > 1:
+            return convert_animation(input_path, output_path, grid_size, grid_offset_x, grid_offset_y, min_confidence,
+                                     sampling, palette, colors, frames, compress_level, scale)
+
+    if strip_rows:
+        # Huge sources are decoded and sampled a strip at a time
+        from pixel_art_stream import convert_file_streaming
+        pixel_art = convert_file_streaming(input_path, grid_size, grid_offset_x, grid_offset_y, sampling,
+                                           palette, colors, min_confidence, strip_rows)
+        with stage('save'):
+            return save_image(pixel_art, output_path, compress_level, scale)
+
+    image = load_image(input_path)
+    mode = image.mode
+    with stage('to_array'):
+        img_array = image_array(image)
+    # From here on the array holds the only copy of the pixels
+    image.close()
+    del image
+
+    if grid_size == 'auto':
+        grid_size, grid_offset_x, grid_offset_y = detect_grid_checked(img_array, min_confidence)
+    pixel_art = convert_array(img_array, mode, grid_size, grid_offset_x, grid_offset_y, sampling, palette, colors)
+    with stage('save'):
+        return save_image(pixel_art, output_path, compress_level, scale)
+
+def collect_inputs(patterns, suffix=None):
+    # Expand globs and directories into a sorted, de-duplicated list of image
+    # files. Files they turn up whose name ends in suffix are earlier outputs
+    # and are left out; files named explicitly are always kept.
+    def is_output(path):
+        return bool(suffix) and os.path.splitext(os.path.basename(path))[0].endswith(suffix)
+
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in sorted(os.listdir(pattern)):
+                path = os.path.join(pattern, name)
+                if os.path.isfile(path) and name.lower().endswith(IMAGE_EXTENSIONS) and not is_output(path):
+                    paths.append(path)
         else:
-            # For smaller grids, use the original loop method
-            output_array = np.zeros((grid_rows, grid_cols, img_array.shape[2]), dtype=img_array.dtype)
-            
-            for row in range(grid_rows):
-                for col in range(grid_cols):
-                    # Calculate center point of grid cell with offset
-                    center_x = self.grid_offset_x + col * self.grid_size + self.grid_size // 2
-                    center_y = self.grid_offset_y + row * self.grid_size + self.grid_size // 2
-                    
-                    # Ensure we don't go out of bounds
-                    center_x = min(center_x, img_width - 1)
-                    center_y = min(center_y, img_height - 1)
-                    
-                    # Get color at center point
-                    output_array[row, col] = img_array[center_y, center_x]
-        
-        # Convert back to PIL Image with original mode to preserve transparency
-        pixel_art = Image.fromarray(output_array, mode=original_mode)
-        
-        # Return the pixel art at its true resolution (no scaling)
-        # Each pixel in the output represents one grid cell from the original
-        return pixel_art
-    
-    def save_result(self):
-        if not self.display_image or self.display_image == self.original_image:
-            messagebox.showwarning("Warning", "No processed image to save")
-            return
-        
-        file_path = filedialog.asksaveasfilename(
-            title="Save Pixel Art",
-            defaultextension=".png",
-            filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("All files", "*.*")]
-        )
-        
-        if file_path:
-            try:
-                self.display_image.save(file_path)
-                messagebox.showinfo("Success", f"Pixel art saved to {file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not save image: {str(e)}")
-    
-    # Zoom and pan methods
-    def zoom_in(self):
-        if self.original_image:
-            self.zoom_level = min(self.zoom_level * 1.5, 10.0)  # Max 10x zoom
-            self.update_display()
-            self.status_label.config(text=f"Zoom: {self.zoom_level:.1f}x")
-    
-    def zoom_out(self):
-        if self.original_image:
-            self.zoom_level = max(self.zoom_level / 1.5, 0.1)  # Min 0.1x zoom
-            self.update_display()
-            self.status_label.config(text=f"Zoom: {self.zoom_level:.1f}x")
-    
-    def reset_zoom(self):
-        if self.original_image:
-            self.zoom_level = 1.0
-            self.pan_x = 0
-            self.pan_y = 0
-            self.update_display()
-            # Reset scroll position to top-left
-            self.canvas.xview_moveto(0)
-            self.canvas.yview_moveto(0)
-            self.status_label.config(text="Zoom reset")
-    
-    def fit_to_window(self):
-        if self.original_image:
-            self.zoom_level = 1.0
-            self.pan_x = 0
-            self.pan_y = 0
-            self.update_display()
-            # Reset scroll position to top-left
-            self.canvas.xview_moveto(0)
-            self.canvas.yview_moveto(0)
-            self.status_label.config(text="Fitted to window")
-    
-    def start_pan(self, event):
-        if self.original_image:
-            self.is_panning = True
-            self.last_pan_x = event.x
-            self.last_pan_y = event.y
-            self.canvas.config(cursor="fleur")  # Cross cursor for panning
-    
-    def pan(self, event):
-        if self.is_panning and self.original_image:
-            dx = event.x - self.last_pan_x
-            dy = event.y - self.last_pan_y
-            self.pan_x += dx
-            self.pan_y += dy
-            self.last_pan_x = event.x
-            self.last_pan_y = event.y
-            
-            # Ensure pan doesn't go too far in any direction
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            if hasattr(self, 'photo'):
-                img_width = self.photo.width()
-                img_height = self.photo.height()
-                
-                # Limit pan to keep some part of the image visible
-                max_pan_x = max(0, img_width - canvas_width // 4)
-                max_pan_y = max(0, img_height - canvas_height // 4)
-                min_pan_x = min(0, -(img_width - canvas_width * 3 // 4))
-                min_pan_y = min(0, -(img_height - canvas_height * 3 // 4))
-                
-                self.pan_x = max(min_pan_x, min(max_pan_x, self.pan_x))
-                self.pan_y = max(min_pan_y, min(max_pan_y, self.pan_y))
-            
-            # Update display immediately for responsive panning
-            self.update_display()
-    
-    def stop_pan(self, event):
-        if self.original_image:
-            self.is_panning = False
-            self.canvas.config(cursor="")
-    
-    def on_mousewheel(self, event):
-        if self.original_image:
-            # Zoom in/out with mouse wheel
-            if event.delta > 0:
-                self.zoom_in()
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if glob.has_magic(pattern):
+                paths.extend(path for path in matches if not is_output(path))
             else:
-                self.zoom_out()
-    
-    def on_middle_click(self, event):
-        if self.original_image:
-            # Middle click to reset zoom
-            self.reset_zoom()
-
-def main():
-    root = tk.Tk()
-    app = PixelArtConverter(root)
-    
-    # Handle window resize
-    def on_resize(event):
-        if hasattr(app, 'display_image') and app.display_image:
-            app.update_display()
-    
-    root.bind("<Configure>", on_resize)
-    
-    root.mainloop()
+                # A plain path that does not exist is kept so it is reported
+                paths.extend(matches if matches else [pattern])
+
+    seen = set()
+    unique = []
+    for path in paths:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+def output_path_for(input_path, output_dir, suffix, extension='png'):
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    directory = output_dir if output_dir else os.path.dirname(input_path)
+    return os.path.join(directory, f"{base}{suffix}.{extension}")
+
+def batch_jobs(inputs, output_dir, suffix, extension='png'):
+    # (input, output) pairs with one output file per input. Inputs that would
+    # share an output, like sprite.png and sprite.jpg, get their source
+    # extension added to the name (sprite_png_pixel.png); a clash that remains,
+    # or an output that would overwrite an input, raises ValueError.
+    def key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    claims = {}
+    for input_path in inputs:
+        claims.setdefault(key(output_path_for(input_path, output_dir, suffix, extension)), []).append(input_path)
+
+    jobs = []
+    for input_path in inputs:
+        output_path = output_path_for(input_path, output_dir, suffix, extension)
+        if len(claims[key(output_path)]) > 1:
+            source_extension = os.path.splitext(input_path)[1].lstrip('.').lower()
+            output_path = output_path_for(input_path, output_dir, f"_{source_extension}{suffix}", extension)
+        jobs.append((input_path, output_path))
+
+    outputs = {}
+    input_keys = {key(input_path) for input_path in inputs}
+    for input_path, output_path in jobs:
+        if key(output_path) in input_keys:
+            raise ValueError(f"{input_path} would be overwritten by its own output; use --suffix or --output-dir")
+        other = outputs.setdefault(key(output_path), input_path)
+        if other != input_path:
+            raise ValueError(f"{other} and {input_path} would both be written to {output_path}")
+    return jobs
+
+def parse_grid_size(text):
+    if text == 'auto':
+        return text
+    if 'x' in text:
+        width, height = text.split('x')
+        grid_size = float(width), float(height)
+    else:
+        grid_size = float(text)
+    if not all(math.isfinite(pitch) for pitch in grid_pitch(grid_size)):
+        raise ValueError(f"grid size must be finite: {text!r}")
+    return grid_size
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pixel_art_converter",
+        description="Convert AI-generated 'pixel art' to true pixel art. "
+                    "Run without arguments to open the GUI."
+    )
+    parser.add_argument("inputs", nargs="+", help="Image files, glob patterns or directories")
+    parser.add_argument("-g", "--grid-size", default="auto",
+                        help="Size of one pixel cell in source pixels (may be fractional, e.g. 7.5), WIDTHxHEIGHT for non-square cells, "
+                             "or 'auto' to detect the grid in each image (default: auto)")
+    parser.add_argument("-x", "--offset-x", type=float, default=0, help="Horizontal grid offset in source pixels")
+    parser.add_argument("-y", "--offset-y", type=float, default=0, help="Vertical grid offset in source pixels")
+    parser.add_argument("--min-confidence", type=float, default=0.5,
+                        help="With --grid-size auto, fail images whose detected grid scores below this (0-1, default: 0.5)")
+    parser.add_argument("-s", "--sampling", choices=SAMPLING_MODES, default="center",
+                        help="How each cell becomes one pixel: its center pixel, or the mean, median, "
+                             "most frequent color (mode) or trimmed mean of the whole cell (default: center)")
+    palette_group = parser.add_mutually_exclusive_group()
+    palette_group.add_argument("-p", "--palette",
+                               help=f"Map colors to a fixed palette: {', '.join(BUILTIN_PALETTES)}, "
+                                    "or a .gpl/.hex palette file")
+    palette_group.add_argument("-c", "--colors", type=int,
+                               help="Map colors to an adaptive palette of this many colors chosen per image")
+    parser.add_argument("--strip-rows", type=int,
+                        help="Decode and sample each image in horizontal strips of about this many source rows "
+                             "to bound memory on huge images (PNG is decoded incrementally)")
+    parser.add_argument("-o", "--output-dir", help="Directory for converted images (default: next to each input)")
+    parser.add_argument("--suffix", default="_pixel", help="Suffix appended to output file names (default: _pixel)")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="png",
+                        help="Output file format, always lossless; PNGs with up to 256 colors are palette-indexed, and GIF "
+                             "fails for images with more colors or partly transparent pixels (default: png)")
+    parser.add_argument("--compress-level", type=int, default=DEFAULT_COMPRESS_LEVEL,
+                        help=f"Compression effort from 0 (fastest) to 9 (smallest files) (default: {DEFAULT_COMPRESS_LEVEL})")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Enlarge the result by this whole factor, each pixel becoming a block (default: 1)")
+    parser.add_argument("--frames", choices=FRAME_MODES, default="animation",
+                        help="For animated or multi-page inputs: write an animation (animated PNG or GIF), "
+                             "a sheet of all frames, or only the first frame (default: animation)")
+    parser.add_argument("-j", "--workers", type=int, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--max-in-flight", type=int, help="Maximum images queued to workers at once (default: 4 per worker)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Convert every image even if an identical conversion is cached")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="Size cap of the result cache in MB; least recently used results are dropped (default: 1024)")
+    parser.add_argument("--timings", choices=TIMING_FORMATS, default=os.environ.get(TIMINGS_ENV) or None,
+                        help="Time each stage of every conversion and print a summary table at the end, "
+                             f"or one JSON line per image (default: ${TIMINGS_ENV})")
+    parser.add_argument("--timings-file", help="Write --timings jsonl lines to this file (default: stderr)")
+    parser.add_argument("--profile", choices=PROFILERS, default=os.environ.get(PROFILE_ENV) or None,
+                        help="Also run cProfile (statistics saved per worker process) or tracemalloc "
+                             f"(peak memory per image) during conversions (default: ${PROFILE_ENV})")
+    parser.add_argument("--profile-dir", default=".", help="Directory for the cProfile .pstats files (default: .)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only report errors")
+    return parser
+
+def run_cli(argv):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        grid_size = parse_grid_size(args.grid_size)
+    except ValueError:
+        parser.error(f"invalid --grid-size {args.grid_size!r}")
+    if grid_size != 'auto' and min(grid_pitch(grid_size)) < 2:
+        parser.error("--grid-size must be at least 2")
+    if not (math.isfinite(args.offset_x) and math.isfinite(args.offset_y)):
+        parser.error("--offset-x and --offset-y must be finite numbers")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.cache_size < 0:
+        parser.error("--cache-size must not be negative")
+    if not 0 <= args.compress_level <= 9:
+        parser.error("--compress-level must be between 0 and 9")
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+    if args.strip_rows is not None and args.strip_rows < 1:
+        parser.error("--strip-rows must be at least 1")
+    if args.colors is not None and not 1 <= args.colors <= 256:
+        parser.error("--colors must be between 1 and 256")
+    # Defaults taken from the environment are not checked by argparse
+    if args.timings not in (None,) + TIMING_FORMATS:
+        parser.error(f"${TIMINGS_ENV} must be one of {', '.join(TIMING_FORMATS)}")
+    if args.profile not in (None,) + PROFILERS:
+        parser.error(f"${PROFILE_ENV} must be one of {', '.join(PROFILERS)}")
+    if args.palette:
+        try:
+            # Build (or load) the palette lookup table once up front so the
+            # workers share it through the on-disk cache
+            palette_lut(load_palette(args.palette))
+        except (OSError, ValueError) as e:
+            parser.error(f"could not load palette: {e}")
+
+    inputs = collect_inputs(args.inputs, args.suffix)
+    if not inputs:
+        parser.error("no input images found")
+    try:
+        jobs = batch_jobs(inputs, args.output_dir, args.suffix, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    from pixel_art_batch import convert_batch
+    from pixel_art_cache import ResultCache
+
+    options = {
+        'grid_size': grid_size,
+        'grid_offset_x': args.offset_x,
+        'grid_offset_y': args.offset_y,
+        'min_confidence': args.min_confidence,
+        'sampling': args.sampling,
+        'palette': args.palette,
+        'colors': args.colors,
+        'strip_rows': args.strip_rows,
+        'frames': args.frames,
+        'compress_level': args.compress_level,
+        'scale': args.scale,
+    }
+
+    # Timings are collected whenever a profiler is on; the table is the default report
+    profiling = None
+    timings_format = args.timings
+    if args.timings or args.profile:
+        profiling = Profiling(args.profile, args.profile_dir)
+        timings_format = args.timings or 'table'
+        if args.profile == 'cprofile':
+            os.makedirs(args.profile_dir, exist_ok=True)
+    summary = TimingSummary()
+    timings_file = None
+    if timings_format == 'jsonl':
+        timings_file = open(args.timings_file, 'w') if args.timings_file else sys.stderr
+
+    def report(done, total, result):
+        if result.error:
+            print(f"[{done}/{total}] Error converting {result.input_path}: {result.error}", file=sys.stderr)
+        elif not args.quiet:
+            width, height = result.size
+            print(f"[{done}/{total}] {result.input_path} -> {result.output_path} ({width}x{height})")
+        if timings_file:
+            print(jsonl_line(result), file=timings_file, flush=True)
+        elif result.timings:
+            summary.add(result.timings)
+
+    # Unchanged sources converted with the same options are taken from the cache
+    cache = None if args.no_cache else ResultCache(max_bytes=args.cache_size << 20)
+    try:
+        results = convert_batch(jobs, options, workers=args.workers, max_in_flight=args.max_in_flight,
+                                progress=report, cache=cache, profiling=profiling)
+    finally:
+        if timings_file and timings_file is not sys.stderr:
+            timings_file.close()
+    failures = sum(1 for result in results if result.error)
+
+    if timings_format == 'table':
+        for line in summary.table():
+            print(line, file=sys.stderr)
+
+    if failures:
+        print(f"{failures} of {len(results)} images failed", file=sys.stderr)
+    return 1 if failures else 0
+
+def __getattr__(name):
+    # The Tk application is only imported on demand so headless use never loads tkinter
+    if name == "PixelArtConverter":
+        from pixel_art_gui import PixelArtConverter
+        return PixelArtConverter
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if not argv:
+        from pixel_art_gui import run_gui
+        run_gui()
+        return 0
+
+    return run_cli(argv)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
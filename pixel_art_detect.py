@@ -0,0 +1,108 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Result of automatic grid detection. Pitches and offsets are in source pixels
+# and may be fractional; confidence is 0 (no grid found) to 1 (perfect grid).
+GridDetection = namedtuple("GridDetection", ["pitch_x", "pitch_y", "offset_x", "offset_y", "confidence"])
+
+# Only this many rows/columns are sampled when building the edge profiles;
+# the grid repeats across the whole image so more lines add cost, not accuracy
+MAX_PROFILE_LINES = 256
+
+# A multiple of the strongest pitch is taken as the real pitch while its
+# spectral peak is at least this fraction of the strongest one
+MULTIPLE_THRESHOLD = 0.5
+
+def edge_profile(img_array, axis):
+    # Sum of absolute differences between neighbouring pixels across all
+    # channels, projected onto the given axis (1 = columns, 0 = rows)
+    other = 1 - axis
+    step = max(1, img_array.shape[other] // MAX_PROFILE_LINES)
+    lines = img_array[::step] if other == 0 else img_array[:, ::step]
+    lines = lines.astype(np.int16)
+    diffs = np.abs(np.diff(lines, axis=axis))
+    sum_axes = tuple(a for a in range(diffs.ndim) if a != axis)
+    return diffs.sum(axis=sum_axes, dtype=np.float64)
+
+def peak_near(spectrum, target):
+    # Index of the largest spectrum value within one bin of target
+    target = int(round(target))
+    lo = max(target - 1, 1)
+    return lo + int(np.argmax(spectrum[lo:target + 2]))
+
+def detect_axis(profile, min_pitch, max_pitch):
+    # Boundary weight at each position: edge strength above the noise floor.
+    # profile[j] is the step between pixels j and j+1, i.e. a cell starting at j+1.
+    weights = np.maximum(profile - np.median(profile), 0.0)
+    total = weights.sum()
+    length = len(weights)
+    max_pitch = min(max_pitch, length / 2)
+    if total <= 0 or max_pitch < min_pitch:
+        return None, 0.0, 0.0
+
+    weights = weights - weights.mean()
+    positions = np.arange(1, length + 1, dtype=np.float64)
+
+    # Zero-padded FFT of the boundary weights; a grid of pitch p shows up as
+    # peaks at 1/p and its harmonics 2/p, 3/p, ...
+    n_fft = 1 << int(np.ceil(np.log2(length * 4)))
+    spectrum = np.abs(np.fft.rfft(weights, n_fft)) / total
+    min_bin = max(1, int(np.ceil(n_fft / max_pitch)))
+    max_bin = int(np.floor(n_fft / min_pitch))
+    index = min_bin + int(np.argmax(spectrum[min_bin:max_bin + 1]))
+
+    # On crisp edges the harmonics are as strong as the fundamental, so the
+    # strongest peak may be k/p. Take the largest whole multiple of its pitch
+    # that still has a strong peak; multiples of the real pitch have none.
+    best = spectrum[index]
+    fundamental = index
+    for multiple in range(2, int(index // min_bin) + 1):
+        candidate = peak_near(spectrum, index / multiple)
+        if candidate >= min_bin and spectrum[candidate] >= best * MULTIPLE_THRESHOLD:
+            fundamental = candidate
+    index = fundamental
+
+    # Refine between bins by fitting a parabola through the peak and its neighbours
+    shift = 0.0
+    if min_bin <= index - 1 and index + 1 < len(spectrum):
+        left, centre, right = spectrum[index - 1:index + 2]
+        curvature = left - 2 * centre + right
+        if curvature < 0:
+            shift = 0.5 * (left - right) / curvature
+    frequency = (index + shift) / n_fft
+
+    # Snap to a whole pitch when the difference would add up to less than a
+    # quarter pixel across the image, so crisp integer grids stay exact
+    whole = round(1.0 / frequency)
+    if abs(1.0 / frequency - whole) * length * frequency < 0.25:
+        frequency = 1.0 / whole
+
+    # Exact DFT at the refined frequency gives the phase (offset) and how much
+    # of the edge energy lines up with the grid (confidence)
+    component = np.exp(-2j * np.pi * frequency * positions) @ weights
+    pitch = 1.0 / frequency
+    offset = round(float(-np.angle(component) / (2 * np.pi) * pitch), 3) % pitch
+    if offset > pitch - 0.5:
+        # The first boundary is within half a pixel of the image edge
+        offset = 0.0
+    confidence = min(1.0, float(np.abs(component) / total))
+    return float(pitch), float(offset), confidence
+
+def detect_grid(image, min_pitch=2, max_pitch=256):
+    # Find the dominant cell pitch and phase on each axis from edge projections.
+    # Returns a GridDetection, or None if the image has no edges at all.
+    img_array = np.asarray(image)
+    if img_array.ndim == 2:
+        img_array = img_array[:, :, np.newaxis]
+
+    pitch_x, offset_x, confidence_x = detect_axis(edge_profile(img_array, 1), min_pitch, max_pitch)
+    pitch_y, offset_y, confidence_y = detect_axis(edge_profile(img_array, 0), min_pitch, max_pitch)
+    if pitch_x is None or pitch_y is None:
+        return None
+
+    return GridDetection(pitch_x, pitch_y, offset_x, offset_y, min(confidence_x, confidence_y))
+
+def grid_from_detection(detection):
+    # Grid parameters in the form convert_to_pixel_art takes them
+    return (detection.pitch_x, detection.pitch_y), detection.offset_x, detection.offset_y
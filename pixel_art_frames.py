@@ -0,0 +1,108 @@
+import math
+from collections import namedtuple
+
+from PIL import Image, ImageSequence
+import numpy as np
+
+from pixel_art_converter import open_unchecked, normalized_mode, image_array, grid_pitch, apply_palette, detect_grid_checked
+from pixel_art_output import DEFAULT_COMPRESS_LEVEL, output_format, save_image, gif_image, upscale_image
+from pixel_art_profile import stage
+from pixel_art_sampling import sample_frames
+
+# Frame delay used when the source does not give one
+DEFAULT_DURATION = 100
+
+# Decoded frames: a (frames, height, width, channels) array in one mode, with
+# the delay of every frame in milliseconds and the loop count (0 = forever)
+Frames = namedtuple("Frames", ["array", "mode", "durations", "loop"])
+
+def frame_count(file_path):
+    # Only the header is read, so huge images converted with --strip-rows get
+    # this far
+    with open_unchecked(file_path) as image:
+        return getattr(image, 'n_frames', 1)
+
+def load_frames(file_path):
+    # All frames of an animated or multi-page image, decoded straight into one
+    # stacked array. Every frame is converted to the mode of the first.
+    with Image.open(file_path) as image:
+        count = getattr(image, 'n_frames', 1)
+        width, height = image.size
+        mode = None
+        array = None
+        durations = []
+        loop = image.info.get('loop', 0)
+        with stage('decode'):
+            for index, frame in enumerate(ImageSequence.Iterator(image)):
+                if mode is None:
+                    mode = normalized_mode(frame.mode)
+                    array = np.empty((count, height, width, len(mode)), dtype=np.uint8)
+                if frame.size != (width, height):
+                    raise ValueError(f"frame {index} is {frame.size[0]}x{frame.size[1]}, not {width}x{height}")
+                array[index] = image_array(frame if frame.mode == mode else frame.convert(mode))
+                durations.append(frame.info.get('duration') or DEFAULT_DURATION)
+    return Frames(array, mode, durations, loop)
+
+def sheet_array(frames_array):
+    # Frames packed left to right, top to bottom into a near-square sheet;
+    # cells without a frame are left transparent (or black)
+    count, rows, cols = frames_array.shape[:3]
+    sheet_cols = math.ceil(math.sqrt(count))
+    sheet_rows = math.ceil(count / sheet_cols)
+    padded = np.zeros((sheet_rows * sheet_cols,) + frames_array.shape[1:], dtype=frames_array.dtype)
+    padded[:count] = frames_array
+    padded = padded.reshape((sheet_rows, sheet_cols) + frames_array.shape[1:])
+    return padded.swapaxes(1, 2).reshape((sheet_rows * rows, sheet_cols * cols) + frames_array.shape[3:])
+
+def save_frames(frames, output_path, layout='animation', compress_level=DEFAULT_COMPRESS_LEVEL, scale=1):
+    # Write converted Frames as an animation in the format of output_path, or
+    # with layout 'sheet' packed into one image. Returns the size of the
+    # written image (of one frame for animations).
+    if layout == 'sheet':
+        sheet = Image.fromarray(sheet_array(frames.array), mode=frames.mode)
+        return save_image(sheet, output_path, compress_level, scale)
+
+    image_format = output_format(output_path)
+    if image_format == 'qoi':
+        raise ValueError("QOI files cannot hold animations; use --frames sheet or --frames first")
+    images = [Image.fromarray(frame, mode=frames.mode) for frame in frames.array]
+    if image_format == 'gif':
+        images = [gif_image(image) for image in images]
+    images = [upscale_image(image, scale) for image in images]
+    options = {'save_all': True, 'append_images': images[1:], 'duration': frames.durations, 'loop': frames.loop}
+    if image_format == 'gif':
+        # Clear each frame before the next, or transparent pixels would show
+        # the previous frame through
+        options['disposal'] = 2
+    elif image_format == 'webp':
+        options.update(lossless=True, quality=100, method=round(compress_level * 6 / 9), exact=True)
+    elif image_format == 'png':
+        options['compress_level'] = compress_level
+    images[0].save(output_path, **options)
+    return images[0].size
+
+def convert_frames(frames, grid_size, grid_offset_x=0, grid_offset_y=0, sampling='center',
+                   palette=None, colors=None, progress=None):
+    # Convert every frame with the same grid in one vectorized pass. An
+    # adaptive palette is chosen once for all frames, so colors do not flicker.
+    pitch_x, pitch_y = grid_pitch(grid_size)
+    with stage('sample'):
+        output_array = sample_frames(frames.array, pitch_x, pitch_y, grid_offset_x, grid_offset_y, sampling, progress)
+    with stage('palette'):
+        output_array = apply_palette(output_array, palette, colors)
+    count = len(frames.array)
+    output_array = output_array.reshape((count, len(output_array) // count) + output_array.shape[1:])
+    return frames._replace(array=output_array)
+
+def convert_animation(input_path, output_path, grid_size, grid_offset_x=0, grid_offset_y=0, min_confidence=0.0,
+                      sampling='center', palette=None, colors=None, layout='animation',
+                      compress_level=DEFAULT_COMPRESS_LEVEL, scale=1):
+    # convert_file for images with several frames. With an automatic grid it
+    # is detected once, on the first frame.
+    frames = load_frames(input_path)
+    if grid_size == 'auto':
+        grid_size, grid_offset_x, grid_offset_y = detect_grid_checked(frames.array[0], min_confidence)
+    converted = convert_frames(frames, grid_size, grid_offset_x, grid_offset_y, sampling, palette, colors)
+    del frames
+    with stage('save'):
+        return save_frames(converted, output_path, layout, compress_level, scale)
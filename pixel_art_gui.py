@@ -0,0 +1,956 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+from PIL import Image, ImageTk
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pixel_art_converter import load_image, image_array, convert_array, convert_to_pixel_art, grid_pitch, apply_palette
+from pixel_art_frames import frame_count, load_frames, convert_frames, save_frames
+from pixel_art_output import save_image
+from pixel_art_detect import detect_grid, grid_from_detection
+from pixel_art_palette import BUILTIN_PALETTES
+from pixel_art_sampling import SAMPLING_MODES, cell_edges
+from pixel_art_view import DEFAULT_CACHE_BYTES, RenderCache, cached_render, render_region, flatten, preview_cells
+
+# Grid lines are only drawn while cells are at least this many screen pixels apart
+MIN_GRID_SPACING = 3
+
+# Redraws are coalesced to at most one per frame of this many milliseconds
+FRAME_MS = 16
+
+# Fast previews shown while zooming or resizing are re-rendered at full
+# quality once nothing has changed for this long
+REFINE_DELAY_MS = 150
+
+# Grid spinboxes: variable name, label and the step of their arrows
+GRID_CONTROLS = (
+    ('pitch_x', "Pitch X", 0.05),
+    ('pitch_y', "Pitch Y", 0.05),
+    ('offset_x', "Offset X", 0.25),
+    ('offset_y', "Offset Y", 0.25),
+)
+
+# Arrow keys move the grid by NUDGE_OFFSET; with Shift they change the cell
+# size by NUDGE_PITCH (Right/Down grow it, Left/Up shrink it)
+NUDGE_OFFSET = 0.25
+NUDGE_PITCH = 0.05
+
+# How often a running background task is checked on
+TASK_POLL_MS = 50
+
+class TaskCancelled(Exception):
+    pass
+
+class PixelArtConverter:
+    def __init__(self, root, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.root = root
+        self.root.title("AI Pixel Art Converter")
+        self.root.geometry("1200x800")
+        
+        # Variables
+        self.original_image = None
+        self.display_image = None
+        self.photo = None
+        self.grid_size = None
+        self.grid_offset_x = 0
+        self.grid_offset_y = 0
+        self.corner_points = []
+        self.is_drawing_grid = False
+        
+        # Zoom variables
+        self.zoom_level = 1.0
+        self.pan_x = 0
+        self.pan_y = 0
+        self.is_panning = False
+        self.last_pan_x = 0
+        self.last_pan_y = 0
+        
+        # Rendered part of the view: (image, display size, rendered area in
+        # scaled image pixels, pan_x, pan_y) at the time it was rendered
+        self.view = None
+        self.display_size = (0, 0)
+        
+        # Recent renders and zoom pyramid levels, within a memory budget
+        self.render_cache = RenderCache(cache_bytes)
+        
+        # Redraw scheduling: pending after() ids, whether the pending redraw
+        # may be a preview, and when the view was last drawn
+        self.redraw_pending = None
+        self.refine_pending = None
+        self.redraw_preview = True
+        self.last_redraw = 0.0
+        self.canvas_size = (0, 0)
+        
+        # Loading and conversion run on one worker thread so the window stays
+        # responsive; task is (future, on_done, on_error) while one runs.
+        # Results are only ever handled on the Tk thread, in poll_task.
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+        self.task_progress = None
+        self.cancel_event = threading.Event()
+        
+        # Decoded pixels of original_image, kept for the live preview, which
+        # redraws only the cells in view
+        self.source_array = None
+        self.preview_photo = None
+        self.preview_pending = None
+        # Main canvas scroll position the preview was last placed for
+        self.preview_scroll = (0, 0)
+        self.grid_text = {}
+        
+        # All frames of an animated source, and the converted frames, or None
+        # for still images; original_image is the first frame
+        self.frames = None
+        self.result_frames = None
+        
+        self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    def setup_ui(self):
+        # Main frame
+        main_frame = ttk.Frame(self.root)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Left panel for controls
+        left_panel = ttk.Frame(main_frame, width=200)
+        left_panel.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+        
+        # Right panel for image display
+        right_panel = ttk.Frame(main_frame)
+        right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+        
+        # Control buttons
+        ttk.Button(left_panel, text="Open Image", command=self.open_image).pack(fill=tk.X, pady=5)
+        ttk.Button(left_panel, text="Select Pixel Corners", command=self.start_corner_selection).pack(fill=tk.X, pady=5)
+        ttk.Button(left_panel, text="Auto Detect Grid", command=self.auto_detect_grid).pack(fill=tk.X, pady=5)
+        ttk.Button(left_panel, text="Clear Selection", command=self.clear_selection).pack(fill=tk.X, pady=5)
+        ttk.Button(left_panel, text="Process Image", command=self.process_image).pack(fill=tk.X, pady=5)
+        ttk.Button(left_panel, text="Save Result", command=self.save_result).pack(fill=tk.X, pady=5)
+        
+        # Sampling mode: how each grid cell becomes one output pixel
+        sampling_frame = ttk.LabelFrame(left_panel, text="Sampling")
+        sampling_frame.pack(fill=tk.X, pady=10)
+        
+        self.sampling_var = tk.StringVar(value='center')
+        sampling_combo = ttk.Combobox(sampling_frame, textvariable=self.sampling_var, values=SAMPLING_MODES,
+                                      state="readonly")
+        sampling_combo.pack(fill=tk.X, pady=5)
+        sampling_combo.bind("<<ComboboxSelected>>", lambda event: self.schedule_preview())
+        
+        # Optional limited palette applied after sampling
+        palette_frame = ttk.LabelFrame(left_panel, text="Palette")
+        palette_frame.pack(fill=tk.X, pady=10)
+        
+        self.palette_var = tk.StringVar(value='none')
+        self.palette_combo = ttk.Combobox(palette_frame, textvariable=self.palette_var,
+                                          values=('none',) + tuple(BUILTIN_PALETTES), state="readonly")
+        self.palette_combo.pack(fill=tk.X, pady=5)
+        self.palette_combo.bind("<<ComboboxSelected>>", lambda event: self.schedule_preview())
+        ttk.Button(palette_frame, text="Load Palette File", command=self.load_palette_file).pack(fill=tk.X, pady=2)
+        
+        # Fine-tuning of the grid, with a live preview of the result
+        grid_frame = ttk.LabelFrame(left_panel, text="Grid")
+        grid_frame.pack(fill=tk.X, pady=10)
+        
+        self.grid_vars = {}
+        for row, (name, label, increment) in enumerate(GRID_CONTROLS):
+            ttk.Label(grid_frame, text=label).grid(row=row, column=0, sticky="w")
+            var = tk.StringVar()
+            spinbox = ttk.Spinbox(grid_frame, textvariable=var, from_=-10000, to=10000, increment=increment,
+                                  width=8, command=self.on_grid_control)
+            spinbox.grid(row=row, column=1, sticky="ew", pady=1)
+            spinbox.bind("<Return>", self.on_grid_control)
+            spinbox.bind("<FocusOut>", self.on_grid_control)
+            self.grid_vars[name] = var
+        grid_frame.grid_columnconfigure(1, weight=1)
+        
+        self.live_preview_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(grid_frame, text="Live Preview", variable=self.live_preview_var,
+                        command=self.toggle_preview).grid(row=len(GRID_CONTROLS), column=0, columnspan=2, sticky="w")
+        
+        # Zoom controls
+        zoom_frame = ttk.LabelFrame(left_panel, text="Zoom Controls")
+        zoom_frame.pack(fill=tk.X, pady=10)
+        
+        zoom_buttons_frame = ttk.Frame(zoom_frame)
+        zoom_buttons_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Button(zoom_buttons_frame, text="Zoom In", command=self.zoom_in).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 2))
+        ttk.Button(zoom_buttons_frame, text="Zoom Out", command=self.zoom_out).pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=(2, 0))
+        
+        ttk.Button(zoom_frame, text="Reset Zoom", command=self.reset_zoom).pack(fill=tk.X, pady=2)
+        ttk.Button(zoom_frame, text="Fit to Window", command=self.fit_to_window).pack(fill=tk.X, pady=2)
+        
+        # Status label
+        self.status_label = ttk.Label(left_panel, text="No image loaded", wraplength=180)
+        self.status_label.pack(fill=tk.X, pady=10)
+        
+        # Progress of loading or converting, which run in the background
+        self.progress_bar = ttk.Progressbar(left_panel, mode='determinate', maximum=100)
+        self.progress_bar.pack(fill=tk.X, pady=2)
+        self.cancel_button = ttk.Button(left_panel, text="Cancel", command=self.cancel_task, state=tk.DISABLED)
+        self.cancel_button.pack(fill=tk.X, pady=2)
+        
+        # Instructions
+        instructions = """
+Instructions:
+1. Open an AI-generated image
+2. Use zoom controls to get a close view
+3. Click "Auto Detect Grid", or click "Select Pixel Corners" and then two corners of what looks like a pixel
+4. Click "Process Image" to convert
+5. Save the result
+
+Zoom Controls:
+• Zoom In/Out buttons or mouse wheel
+• Right-click and drag to pan
+• Middle-click to reset zoom
+• "Fit to Window" to reset view
+
+Grid:
+• Arrow keys nudge the grid
+• Shift+arrows change the cell size
+• "Live Preview" shows the result beside the image
+        """
+        ttk.Label(left_panel, text=instructions, wraplength=180, justify=tk.LEFT).pack(fill=tk.X, pady=10)
+        
+        # Create a frame for the canvas and scrollbars
+        canvas_frame = ttk.Frame(right_panel)
+        canvas_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        # Live preview of the converted result, shown beside the image at the
+        # same position and zoom when enabled
+        self.preview_canvas = tk.Canvas(right_panel, bg="white")
+        
+        # Image display area
+        self.canvas = tk.Canvas(canvas_frame, bg="white", cursor="cross")
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        
+        # Scrollbars
+        h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.scroll_x)
+        v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.scroll_y)
+        h_scrollbar.grid(row=1, column=0, sticky="ew")
+        v_scrollbar.grid(row=0, column=1, sticky="ns")
+        
+        # Configure grid weights
+        canvas_frame.grid_rowconfigure(0, weight=1)
+        canvas_frame.grid_columnconfigure(0, weight=1)
+        
+        self.canvas.configure(xscrollcommand=h_scrollbar.set, yscrollcommand=v_scrollbar.set)
+        
+        # Bind mouse events
+        self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Motion>", self.on_canvas_motion)
+        self.canvas.bind("<Button-3>", self.start_pan)  # Right click to start panning
+        self.canvas.bind("<B3-Motion>", self.pan)  # Right click drag to pan
+        self.canvas.bind("<ButtonRelease-3>", self.stop_pan)  # Release right click to stop panning
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)  # Mouse wheel to zoom
+        self.canvas.bind("<Button-2>", self.on_middle_click)  # Middle click to reset zoom
+        self.canvas.bind("<Configure>", self.on_canvas_resize)  # Window resize
+        
+        # Arrow keys nudge the grid while the canvas has focus
+        for key, dx, dy in (("Left", -1, 0), ("Right", 1, 0), ("Up", 0, -1), ("Down", 0, 1)):
+            self.canvas.bind(f"<{key}>", lambda event, dx=dx, dy=dy: self.nudge_grid(dx * NUDGE_OFFSET, dy * NUDGE_OFFSET, 0, 0))
+            self.canvas.bind(f"<Shift-{key}>", lambda event, dx=dx, dy=dy: self.nudge_grid(0, 0, dx * NUDGE_PITCH, dy * NUDGE_PITCH))
+        
+    def open_image(self):
+        file_path = filedialog.askopenfilename(
+            title="Select Image",
+            filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp *.gif *.tiff")]
+        )
+        
+        if file_path:
+            def load():
+                # Decode fully here rather than lazily on the Tk thread
+                frames = None
+                if frame_count(file_path) > 1:
+                    frames = load_frames(file_path)
+                    img_array = frames.array[0]
+                    image = Image.fromarray(img_array, mode=frames.mode)
+                else:
+                    image = load_image(file_path)
+                    img_array = image_array(image)
+                if image.mode == 'RGBA':
+                    # Pillow can display straight from the array's memory, so
+                    # the pixels are held once. (Its RGB layout differs from
+                    # NumPy's, so RGB images keep both.)
+                    image = Image.frombuffer('RGBA', image.size, img_array, 'raw', 'RGBA', 0, 1)
+                return image, img_array, frames
+            
+            def show(result):
+                self.original_image, self.source_array, self.frames = result
+                self.result_frames = None
+                
+                self.display_image = self.original_image
+                self.update_display()
+                name = os.path.basename(file_path)
+                if self.frames is not None:
+                    name += f" ({len(self.frames.array)} frames)"
+                self.status_label.config(text=f"Loaded: {name}")
+                self.clear_selection()
+            
+            def failed(e):
+                messagebox.showerror("Error", f"Could not open image: {str(e)}")
+            
+            self.run_task(f"Loading {os.path.basename(file_path)}...", load, show, failed)
+    
+    def run_task(self, message, work, on_done, on_error):
+        # Run work() on the worker thread, then on_done(result) or on_error(e)
+        # back on the Tk thread
+        if self.task is not None:
+            messagebox.showwarning("Warning", "Please wait for the current task to finish or cancel it")
+            return
+        
+        self.cancel_event.clear()
+        self.task_progress = None
+        self.task = (self.executor.submit(work), on_done, on_error)
+        self.status_label.config(text=message)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.progress_bar.config(mode='indeterminate')
+        self.progress_bar.start(TASK_POLL_MS)
+        self.root.after(TASK_POLL_MS, self.poll_task)
+    
+    def report_progress(self, fraction):
+        # Called on the worker thread, so only plain attributes are touched;
+        # raising here is what stops a cancelled conversion
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+        self.task_progress = fraction
+    
+    def poll_task(self):
+        future, on_done, on_error = self.task
+        if not future.done():
+            if self.task_progress is not None:
+                # The task reports how far it is; show that instead
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate', value=self.task_progress * 100)
+            self.root.after(TASK_POLL_MS, self.poll_task)
+            return
+        
+        self.task = None
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate', value=0)
+        self.cancel_button.config(state=tk.DISABLED)
+        
+        if self.cancel_event.is_set():
+            self.status_label.config(text="Cancelled")
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            on_error(e)
+            return
+        on_done(result)
+    
+    def cancel_task(self):
+        if self.task is not None:
+            self.cancel_event.set()
+            self.status_label.config(text="Cancelling...")
+    
+    def on_close(self):
+        # Stop a running conversion at its next step instead of waiting for it
+        self.cancel_event.set()
+        self.executor.shutdown(wait=False)
+        self.root.destroy()
+    
+    def schedule_redraw(self, preview=False):
+        # Mark the view dirty; it is drawn once, from the latest state, when Tk
+        # is idle and at most once per frame. Intermediate states are dropped.
+        self.redraw_preview = self.redraw_preview and preview
+        if self.redraw_pending is None:
+            delay = int(FRAME_MS - (time.perf_counter() - self.last_redraw) * 1000)
+            if delay > 0:
+                self.redraw_pending = self.root.after(delay, self.redraw)
+            else:
+                self.redraw_pending = self.root.after_idle(self.redraw)
+        
+        if preview:
+            # Refine once the interaction has paused
+            if self.refine_pending is not None:
+                self.root.after_cancel(self.refine_pending)
+            self.refine_pending = self.root.after(REFINE_DELAY_MS, self.refine)
+    
+    def redraw(self):
+        preview = self.redraw_preview
+        self.redraw_pending = None
+        self.redraw_preview = True
+        self.last_redraw = time.perf_counter()
+        self.update_display(preview)
+    
+    def refine(self):
+        self.refine_pending = None
+        self.schedule_redraw()
+    
+    def on_canvas_resize(self, event):
+        # Only the canvas is bound, and only real size changes count
+        if (event.width, event.height) != self.canvas_size:
+            self.canvas_size = (event.width, event.height)
+            if self.display_image:
+                self.schedule_redraw(preview=True)
+    
+    def update_display(self, preview=False):
+        # With preview, newly rendered areas use fast nearest-neighbour scaling
+        if self.display_image:
+            # Calculate display size to fit in canvas
+            canvas_width = self.canvas.winfo_width()
+            canvas_height = self.canvas.winfo_height()
+            
+            if canvas_width <= 1 or canvas_height <= 1:
+                # Canvas not yet sized, use default
+                canvas_width, canvas_height = 800, 600
+            
+            # Calculate base scale to fit image in canvas
+            img_width, img_height = self.display_image.size
+            scale_x = canvas_width / img_width
+            scale_y = canvas_height / img_height
+            base_scale = min(scale_x, scale_y, 1.0)  # Don't scale up
+            
+            # Apply zoom level
+            scale = base_scale * self.zoom_level
+            
+            # Size of the whole image at this scale; only the part of it that
+            # is on screen is ever rendered
+            display_width = max(1, int(img_width * scale))
+            display_height = max(1, int(img_height * scale))
+            self.display_size = (display_width, display_height)
+            
+            # Apply pan offset
+            x_offset = self.pan_x
+            y_offset = self.pan_y
+            
+            # Visible part of the canvas, in scaled image pixels
+            view_left = int(self.canvas.canvasx(0)) - x_offset
+            view_top = int(self.canvas.canvasy(0)) - y_offset
+            visible = (max(0, view_left), max(0, view_top),
+                       min(display_width, view_left + canvas_width), min(display_height, view_top + canvas_height))
+            
+            # Use faster resampling for better performance
+            if self.zoom_level >= 2.0 or preview:
+                resampling = Image.Resampling.NEAREST
+            else:
+                resampling = Image.Resampling.LANCZOS
+            
+            view = self.view
+            if (view is not None and view[0] is self.display_image and view[1] == self.display_size
+                    and (view[5] == resampling or preview) and self.rect_contains(view[2], visible)):
+                # Pure pan inside the area rendered last time: just move the
+                # existing canvas items
+                self.canvas.move("all", x_offset - view[3], y_offset - view[4])
+                # The preview canvas does not scroll, so it also moves against
+                # any scrolling of the main canvas (scrollbars pan with no offset)
+                scroll = (self.canvas.canvasx(0), self.canvas.canvasy(0))
+                self.preview_canvas.move("all", x_offset - view[3] - (scroll[0] - self.preview_scroll[0]),
+                                         y_offset - view[4] - (scroll[1] - self.preview_scroll[1]))
+                self.preview_scroll = scroll
+                self.view = view[:3] + (x_offset, y_offset) + view[5:]
+            else:
+                self.render_viewport(visible, canvas_width, canvas_height, x_offset, y_offset, resampling)
+            
+            # Set proper scroll region to include the entire image area
+            scroll_left = min(0, x_offset)
+            scroll_top = min(0, y_offset)
+            scroll_right = max(canvas_width, x_offset + display_width)
+            scroll_bottom = max(canvas_height, y_offset + display_height)
+            
+            self.canvas.configure(scrollregion=(scroll_left, scroll_top, scroll_right, scroll_bottom))
+            
+            # Store scale for coordinate conversion
+            self.scale_factor = scale
+    
+    def rect_contains(self, outer, inner):
+        return (inner[0] >= inner[2] or inner[1] >= inner[3] or
+                (outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]))
+    
+    def render_viewport(self, visible, canvas_width, canvas_height, x_offset, y_offset, resampling):
+        # Scale only the visible region, plus a margin of half a canvas on each
+        # side so that short pans can reuse it, instead of the whole image
+        display_width, display_height = self.display_size
+        margin_x = canvas_width // 2
+        margin_y = canvas_height // 2
+        left = max(0, visible[0] - margin_x)
+        top = max(0, visible[1] - margin_y)
+        right = min(display_width, visible[2] + margin_x)
+        bottom = min(display_height, visible[3] + margin_y)
+        
+        # Update canvas
+        self.canvas.delete("all")
+        self.photo = None
+        self.display_image_resized = None
+        region = (left, top, right, bottom)
+        
+        if left < right and top < bottom:
+            # Going back to a zoom level (or area) seen recently reuses its render
+            cached = cached_render(self.display_image, self.display_size, visible, resampling, self.render_cache)
+            if cached:
+                region, resized_image = cached
+            else:
+                resized_image = render_region(self.display_image, self.display_size, region, resampling, self.render_cache)
+            
+            self.display_image_resized = resized_image
+            self.photo = ImageTk.PhotoImage(resized_image)
+            self.canvas.create_image(x_offset + region[0], y_offset + region[1], anchor=tk.NW, image=self.photo, tags="image")
+        
+        self.view = (self.display_image, self.display_size, region, x_offset, y_offset, resampling)
+        self.draw_grid_lines()
+        self.schedule_preview()
+    
+    def scroll_x(self, *args):
+        # Scrolling uncovers parts of the image that may not be rendered yet
+        self.canvas.xview(*args)
+        self.schedule_redraw(preview=True)
+    
+    def scroll_y(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_redraw(preview=True)
+    
+    def start_corner_selection(self):
+        if not self.original_image:
+            messagebox.showwarning("Warning", "Please open an image first")
+            return
+        
+        self.is_drawing_grid = True
+        self.corner_points = []
+        self.status_label.config(text="Click two corners of a pixel")
+        self.canvas.config(cursor="crosshair")
+    
+    def on_canvas_click(self, event):
+        # Take keyboard focus so the arrow keys nudge the grid
+        self.canvas.focus_set()
+        if not self.is_drawing_grid or not self.original_image:
+            return
+        
+        # Convert canvas coordinates to image coordinates (accounting for pan and zoom)
+        # First, convert from canvas coordinates to image coordinates
+        canvas_x = event.x - self.pan_x
+        canvas_y = event.y - self.pan_y
+        
+        # Then convert to actual image coordinates. These are kept fractional so
+        # a zoomed-in selection can define a sub-pixel grid pitch and offset.
+        x = canvas_x / self.scale_factor
+        y = canvas_y / self.scale_factor
+        
+        # Ensure coordinates are within image bounds
+        img_width, img_height = self.original_image.size
+        x = max(0, min(x, img_width))
+        y = max(0, min(y, img_height))
+        
+        self.corner_points.append((x, y))
+        
+        # Draw point on canvas at the actual click position
+        self.canvas.create_oval(event.x-3, event.y-3, event.x+3, event.y+3, 
+                              fill="red", outline="red", tags="selection")
+        
+        if len(self.corner_points) == 2:
+            self.create_grid()
+            self.is_drawing_grid = False
+            self.canvas.config(cursor="")
+            self.status_label.config(text="Grid created. Click 'Process Image' to convert.")
+    
+    def on_canvas_motion(self, event):
+        if self.is_drawing_grid and len(self.corner_points) == 1:
+            # Show preview line
+            self.canvas.delete("preview")
+            x1, y1 = self.corner_points[0]
+            # Convert first point back to canvas coordinates
+            canvas_x1 = int(x1 * self.scale_factor) + self.pan_x
+            canvas_y1 = int(y1 * self.scale_factor) + self.pan_y
+            # Draw line from first point to current mouse position
+            self.canvas.create_line(canvas_x1, canvas_y1, event.x, event.y, 
+                                  fill="red", dash=(5, 5), tags="preview")
+    
+    def create_grid(self):
+        if len(self.corner_points) != 2:
+            return
+        
+        # Calculate grid size and offset
+        x1, y1 = self.corner_points[0]
+        x2, y2 = self.corner_points[1]
+        
+        # Calculate the diagonal distance
+        dx = abs(x2 - x1)
+        dy = abs(y2 - y1)
+        self.grid_size = max(dx, dy)  # Use the larger dimension as grid size
+        
+        if self.grid_size < 2:
+            messagebox.showwarning("Warning", "Grid size too small. Please select points further apart.")
+            self.clear_selection()
+            return
+        
+        # Calculate grid offset based on the first point
+        # This ensures the grid aligns with the pixel boundaries you selected
+        self.grid_offset_x = x1 % self.grid_size
+        self.grid_offset_y = y1 % self.grid_size
+        
+        # Create grid overlay
+        self.draw_grid_overlay()
+    
+    def auto_detect_grid(self):
+        if not self.original_image:
+            messagebox.showwarning("Warning", "Please open an image first")
+            return
+        
+        detection = detect_grid(self.source_array)
+        if detection is None:
+            messagebox.showwarning("Warning", "No pixel grid found. Please select pixel corners manually.")
+            return
+        
+        self.corner_points = []
+        self.is_drawing_grid = False
+        self.canvas.config(cursor="")
+        self.grid_size, self.grid_offset_x, self.grid_offset_y = grid_from_detection(detection)
+        self.draw_grid_overlay()
+        
+        pitch_x, pitch_y = grid_pitch(self.grid_size)
+        self.status_label.config(text=f"Detected grid: {pitch_x:.4g}x{pitch_y:.4g} at offset ({self.grid_offset_x:.3g}, {self.grid_offset_y:.3g}), "
+                                      f"confidence {detection.confidence:.0%}. Click 'Process Image' to convert.")
+    
+    def draw_grid_overlay(self):
+        if not self.original_image or not self.grid_size:
+            return
+        
+        self.sync_grid_controls()
+        
+        # The grid is drawn on the canvas, over the original image
+        if self.display_image is not self.original_image:
+            self.display_image = self.original_image
+            self.update_display()
+        else:
+            self.draw_grid_lines()
+            self.schedule_preview()
+    
+    def sync_grid_controls(self):
+        # Show the current grid in the spinboxes
+        if self.grid_size:
+            pitch_x, pitch_y = grid_pitch(self.grid_size)
+            values = {'pitch_x': pitch_x, 'pitch_y': pitch_y,
+                      'offset_x': self.grid_offset_x, 'offset_y': self.grid_offset_y}
+            for name, var in self.grid_vars.items():
+                var.set(f"{round(values[name], 4):g}")
+        else:
+            for var in self.grid_vars.values():
+                var.set("")
+        # Remember what was shown, so leaving a spinbox untouched changes nothing
+        self.grid_text = {name: var.get() for name, var in self.grid_vars.items()}
+    
+    def on_grid_control(self, event=None):
+        if not self.original_image or self.grid_text == {name: var.get() for name, var in self.grid_vars.items()}:
+            return
+        try:
+            values = {name: float(var.get()) for name, var in self.grid_vars.items()}
+        except ValueError:
+            # Not a number; put the current grid back
+            self.sync_grid_controls()
+            return
+        self.set_grid(values['pitch_x'], values['pitch_y'], values['offset_x'], values['offset_y'])
+    
+    def nudge_grid(self, dx, dy, dpitch_x, dpitch_y):
+        if not self.original_image or not self.grid_size:
+            return
+        pitch_x, pitch_y = grid_pitch(self.grid_size)
+        self.set_grid(pitch_x + dpitch_x, pitch_y + dpitch_y, self.grid_offset_x + dx, self.grid_offset_y + dy)
+    
+    def set_grid(self, pitch_x, pitch_y, offset_x, offset_y):
+        # Rounded so repeated nudges do not collect floating point noise
+        grid_size = (round(pitch_x, 4), round(pitch_y, 4))
+        if min(grid_size) < 2:
+            self.sync_grid_controls()
+            return
+        if (grid_size == grid_pitch(self.grid_size or (0, 0))
+                and (offset_x, offset_y) == (self.grid_offset_x, self.grid_offset_y)):
+            return
+        
+        pitch_x, pitch_y = grid_size
+        self.grid_size = grid_size
+        self.grid_offset_x = round(offset_x % pitch_x, 4)
+        self.grid_offset_y = round(offset_y % pitch_y, 4)
+        self.draw_grid_overlay()
+        self.status_label.config(text=f"Grid: {pitch_x:.4g}x{pitch_y:.4g} at offset ({self.grid_offset_x:.3g}, {self.grid_offset_y:.3g})")
+    
+    def toggle_preview(self):
+        if self.live_preview_var.get():
+            self.preview_canvas.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+        else:
+            self.preview_canvas.pack_forget()
+        self.schedule_preview()
+    
+    def schedule_preview(self):
+        # Coalesce changes into one preview update when Tk is idle
+        if self.preview_pending is None:
+            self.preview_pending = self.root.after_idle(self.update_preview)
+    
+    def update_preview(self):
+        # Convert only the cells under the rendered part of the view and draw
+        # them at the same position and zoom as the image
+        self.preview_pending = None
+        self.preview_canvas.delete("all")
+        self.preview_photo = None
+        if (not self.live_preview_var.get() or not self.grid_size or self.view is None
+                or self.display_image is not self.original_image or self.source_array is None):
+            return
+        
+        img_width, img_height = self.original_image.size
+        display_width, display_height = self.display_size
+        scale_x = display_width / img_width
+        scale_y = display_height / img_height
+        _, _, (left, top, right, bottom), x_offset, y_offset, _ = self.view
+        region = (left / scale_x, top / scale_y, right / scale_x, bottom / scale_y)
+        
+        tile = preview_cells(self.source_array, self.grid_size, self.grid_offset_x, self.grid_offset_y,
+                             region, self.sampling_var.get())
+        if tile is None:
+            return
+        
+        cells = tile.cells
+        palette = self.palette_var.get()
+        if palette != 'none':
+            try:
+                cells = apply_palette(cells, palette)
+            except (OSError, ValueError):
+                pass  # Reported when the image is processed
+        
+        # Each computed cell stands for stride x stride cells of the grid
+        pitch_x, pitch_y = grid_pitch(self.grid_size)
+        rows, cols = cells.shape[:2]
+        width = max(1, round(cols * tile.stride * pitch_x * scale_x))
+        height = max(1, round(rows * tile.stride * pitch_y * scale_y))
+        preview = flatten(Image.fromarray(cells).resize((width, height), Image.Resampling.NEAREST))
+        
+        # The preview canvas does not scroll, so undo the main canvas scrolling
+        self.preview_scroll = (self.canvas.canvasx(0), self.canvas.canvasy(0))
+        x = x_offset - self.preview_scroll[0] + (self.grid_offset_x + tile.first_col * pitch_x) * scale_x
+        y = y_offset - self.preview_scroll[1] + (self.grid_offset_y + tile.first_row * pitch_y) * scale_y
+        self.preview_photo = ImageTk.PhotoImage(preview)
+        self.preview_canvas.create_image(round(x), round(y), anchor=tk.NW, image=self.preview_photo)
+    
+    def draw_grid_lines(self):
+        # Grid lines as canvas items, only over the rendered area so the cost
+        # follows what is on screen rather than the image size. They move with
+        # the image on pans and are redrawn whenever the view is re-rendered.
+        self.canvas.delete("grid")
+        if (not self.grid_size or self.view is None or self.display_image is not self.original_image):
+            return
+        
+        img_width, img_height = self.original_image.size
+        display_width, display_height = self.display_size
+        scale_x = display_width / img_width
+        scale_y = display_height / img_height
+        pitch_x, pitch_y = grid_pitch(self.grid_size)
+        if pitch_x * scale_x < MIN_GRID_SPACING or pitch_y * scale_y < MIN_GRID_SPACING:
+            # Lines this close together would just cover the image
+            return
+        
+        _, _, (left, top, right, bottom), x_offset, y_offset, _ = self.view
+        
+        # Draw vertical grid lines with offset
+        for x in cell_edges(img_width, pitch_x, self.grid_offset_x, left / scale_x, right / scale_x):
+            canvas_x = x_offset + x * scale_x
+            self.canvas.create_line(canvas_x, y_offset + top, canvas_x, y_offset + bottom, fill="red", tags="grid")
+        
+        # Draw horizontal grid lines with offset
+        for y in cell_edges(img_height, pitch_y, self.grid_offset_y, top / scale_y, bottom / scale_y):
+            canvas_y = y_offset + y * scale_y
+            self.canvas.create_line(x_offset + left, canvas_y, x_offset + right, canvas_y, fill="red", tags="grid")
+    
+    def clear_selection(self):
+        self.corner_points = []
+        self.grid_size = None
+        self.grid_offset_x = 0
+        self.grid_offset_y = 0
+        self.is_drawing_grid = False
+        self.canvas.delete("all")
+        self.view = None
+        self.canvas.config(cursor="")
+        self.sync_grid_controls()
+        
+        if self.original_image:
+            self.display_image = self.original_image
+            self.update_display()
+        
+        self.status_label.config(text="Selection cleared")
+    
+    def process_image(self):
+        if not self.original_image or not self.grid_size:
+            messagebox.showwarning("Warning", "Please select pixel corners first")
+            return
+        
+        # Settings are read here, on the Tk thread; the source image is never
+        # modified, so the worker can read it while the user pans around
+        image = self.original_image
+        img_array = self.source_array
+        frames = self.frames
+        settings = self.conversion_settings()
+        
+        def convert():
+            if frames is None:
+                return convert_array(img_array, image.mode, progress=self.report_progress, **settings), None
+            # Every frame with the same grid, in one pass; the first is shown
+            converted = convert_frames(frames, progress=self.report_progress, **settings)
+            return Image.fromarray(converted.array[0], mode=converted.mode), converted
+        
+        def show(result):
+            # Display result
+            pixel_art, self.result_frames = result
+            self.display_image = pixel_art
+            self.update_display()
+            
+            # Show resolution information
+            original_width, original_height = image.size
+            pixel_width, pixel_height = pixel_art.size
+            self.status_label.config(text=f"Converted: {original_width}x{original_height} → {pixel_width}x{pixel_height}")
+            messagebox.showinfo("Success", f"Image converted to pixel art!\nResolution: {original_width}x{original_height} → {pixel_width}x{pixel_height}")
+        
+        def failed(e):
+            messagebox.showerror("Error", f"Error processing image: {str(e)}")
+            self.status_label.config(text="Processing failed")
+        
+        self.run_task("Processing image...", convert, show, failed)
+    
+    def conversion_settings(self):
+        palette = self.palette_var.get()
+        return {
+            'grid_size': self.grid_size,
+            'grid_offset_x': self.grid_offset_x,
+            'grid_offset_y': self.grid_offset_y,
+            'sampling': self.sampling_var.get(),
+            'palette': None if palette == 'none' else palette,
+        }
+    
+    def convert_to_pixel_art(self):
+        if not self.original_image or not self.grid_size:
+            return None
+        
+        return convert_to_pixel_art(self.original_image, **self.conversion_settings())
+    
+    def load_palette_file(self):
+        file_path = filedialog.askopenfilename(
+            title="Select Palette",
+            filetypes=[("Palette files", "*.gpl *.hex"), ("All files", "*.*")]
+        )
+        
+        if file_path:
+            values = tuple(self.palette_combo.cget('values'))
+            if file_path not in values:
+                self.palette_combo.config(values=values + (file_path,))
+            self.palette_var.set(file_path)
+    
+    def save_result(self):
+        if not self.display_image or self.display_image == self.original_image:
+            messagebox.showwarning("Warning", "No processed image to save")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title="Save Pixel Art",
+            defaultextension=".png",
+            filetypes=[("PNG files", "*.png"), ("GIF files", "*.gif"), ("WebP files", "*.webp"), ("QOI files", "*.qoi")]
+        )
+        
+        if file_path:
+            try:
+                if self.result_frames is not None:
+                    # Animated PNG, GIF or WebP, depending on the file name
+                    save_frames(self.result_frames, file_path)
+                else:
+                    save_image(self.display_image, file_path)
+                messagebox.showinfo("Success", f"Pixel art saved to {file_path}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not save image: {str(e)}")
+    
+    # Zoom and pan methods
+    def zoom_in(self):
+        if self.original_image:
+            self.zoom_level = min(self.zoom_level * 1.5, 10.0)  # Max 10x zoom
+            self.schedule_redraw(preview=True)
+            self.status_label.config(text=f"Zoom: {self.zoom_level:.1f}x")
+    
+    def zoom_out(self):
+        if self.original_image:
+            self.zoom_level = max(self.zoom_level / 1.5, 0.1)  # Min 0.1x zoom
+            self.schedule_redraw(preview=True)
+            self.status_label.config(text=f"Zoom: {self.zoom_level:.1f}x")
+    
+    def reset_zoom(self):
+        if self.original_image:
+            self.zoom_level = 1.0
+            self.pan_x = 0
+            self.pan_y = 0
+            self.update_display()
+            # Reset scroll position to top-left
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
+            self.update_display()
+            self.status_label.config(text="Zoom reset")
+    
+    def fit_to_window(self):
+        if self.original_image:
+            self.zoom_level = 1.0
+            self.pan_x = 0
+            self.pan_y = 0
+            self.update_display()
+            # Reset scroll position to top-left
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
+            self.update_display()
+            self.status_label.config(text="Fitted to window")
+    
+    def start_pan(self, event):
+        self.canvas.focus_set()
+        if self.original_image:
+            self.is_panning = True
+            self.last_pan_x = event.x
+            self.last_pan_y = event.y
+            self.canvas.config(cursor="fleur")  # Cross cursor for panning
+    
+    def pan(self, event):
+        if self.is_panning and self.original_image:
+            dx = event.x - self.last_pan_x
+            dy = event.y - self.last_pan_y
+            self.pan_x += dx
+            self.pan_y += dy
+            self.last_pan_x = event.x
+            self.last_pan_y = event.y
+            
+            # Ensure pan doesn't go too far in any direction
+            canvas_width = self.canvas.winfo_width()
+            canvas_height = self.canvas.winfo_height()
+            if self.display_image:
+                img_width, img_height = self.display_size
+                
+                # Limit pan to keep some part of the image visible
+                max_pan_x = max(0, img_width - canvas_width // 4)
+                max_pan_y = max(0, img_height - canvas_height // 4)
+                min_pan_x = min(0, -(img_width - canvas_width * 3 // 4))
+                min_pan_y = min(0, -(img_height - canvas_height * 3 // 4))
+                
+                self.pan_x = max(min_pan_x, min(max_pan_x, self.pan_x))
+                self.pan_y = max(min_pan_y, min(max_pan_y, self.pan_y))
+            
+            # Usually only moves the rendered view; re-renders when the pan
+            # uncovers an area that has not been rendered
+            self.schedule_redraw(preview=True)
+    
+    def stop_pan(self, event):
+        if self.original_image:
+            self.is_panning = False
+            self.canvas.config(cursor="")
+    
+    def on_mousewheel(self, event):
+        if self.original_image:
+            # Zoom in/out with mouse wheel
+            if event.delta > 0:
+                self.zoom_in()
+            else:
+                self.zoom_out()
+    
+    def on_middle_click(self, event):
+        if self.original_image:
+            # Middle click to reset zoom
+            self.reset_zoom()
+
+def run_gui():
+    root = tk.Tk()
+    PixelArtConverter(root)
+    root.mainloop()
+
+if __name__ == "__main__":
+    run_gui()
@@ -0,0 +1,183 @@
+import os
+
+from PIL import Image
+import numpy as np
+
+# Formats converted images can be written in. All are lossless: JPEG would
+# smear the hard pixel edges, so it is not offered, and GIF refuses images it
+# cannot hold exactly.
+OUTPUT_FORMATS = ('png', 'gif', 'webp', 'qoi')
+
+# Compression effort from 0 (fastest) to 9 (smallest). Pixel art results are
+# small and compress well at any level, so batch runs default to a fast one;
+# level 9 rarely saves more than a few percent.
+DEFAULT_COMPRESS_LEVEL = 3
+
+def output_format(output_path):
+    return os.path.splitext(output_path)[1].lower().lstrip('.')
+
+def indexed_image(image):
+    # The image as a palette ("P") image holding exactly the same colors, or
+    # None if it has more than 256. Transparency is kept per palette entry.
+    img_array = np.asarray(image)
+    if img_array.ndim == 2 or image.mode not in ('RGB', 'RGBA'):
+        return None
+
+    keys = np.zeros(img_array.shape[:2], dtype=np.uint32)
+    for channel in range(img_array.shape[2]):
+        keys |= img_array[..., channel].astype(np.uint32) << (8 * channel)
+    colors, indices = np.unique(keys, return_inverse=True)
+    if len(colors) > 256:
+        return None
+
+    channels = (colors[:, np.newaxis] >> (8 * np.arange(img_array.shape[2], dtype=np.uint32))) & 0xFF
+    indexed = Image.fromarray(indices.reshape(keys.shape).astype(np.uint8), 'P')
+    indexed.putpalette(channels[:, :3].astype(np.uint8).tobytes())
+    if image.mode == 'RGBA' and (channels[:, 3] < 255).any():
+        indexed.info['transparency'] = channels[:, 3].astype(np.uint8).tobytes()
+    return indexed
+
+def gif_image(image):
+    # The image as a palette image GIF holds without loss, with transparent
+    # pixels sharing the one transparent palette entry. Raises ValueError for
+    # images with more than 256 colors or partly transparent pixels, which
+    # Pillow would otherwise quantize or make opaque.
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    if image.mode == 'RGBA':
+        img_array = np.asarray(image)
+        alpha = img_array[..., 3]
+        if ((alpha > 0) & (alpha < 255)).any():
+            raise ValueError("GIF cannot hold partly transparent pixels; use png, webp or qoi")
+        image = Image.fromarray(np.where(alpha[..., np.newaxis] == 0, 0, img_array).astype(np.uint8), 'RGBA')
+
+    indexed = indexed_image(image)
+    if indexed is None:
+        raise ValueError("GIF holds at most 256 colors; use png, webp or qoi, or reduce them with --colors")
+    alphas = indexed.info.pop('transparency', None)
+    if alphas is not None:
+        indexed.info['transparency'] = alphas.index(0)
+    return indexed
+
+def upscale_image(image, scale):
+    # Nearest-neighbour enlargement by a whole factor, every pixel becoming a
+    # scale x scale block
+    if scale <= 1:
+        return image
+    return image.resize((image.width * scale, image.height * scale), Image.Resampling.NEAREST)
+
+def palette_bits(image):
+    # Smallest PNG bit depth that holds the palette of a P image
+    count = len(image.getpalette() or []) // 3
+    for bits in (1, 2, 4):
+        if count <= 1 << bits:
+            return bits
+    return 8
+
+def encode_qoi(img_array):
+    # QOI ("Quite OK Image") encoding of an RGB or RGBA array, done with array
+    # operations instead of a loop over pixels. Each pixel becomes one chunk
+    # (or part of a run); which one only depends on the previous pixel and on
+    # the last earlier pixel with the same hash, both of which can be looked
+    # up for all pixels at once.
+    height, width, channels = img_array.shape
+    pixels = img_array.reshape(-1, channels).astype(np.int32)
+    if channels == 3:
+        pixels = np.concatenate([pixels, np.full((len(pixels), 1), 255, dtype=np.int32)], axis=1)
+    count = len(pixels)
+
+    previous = np.empty_like(pixels)
+    previous[0] = (0, 0, 0, 255)
+    previous[1:] = pixels[:-1]
+    repeat = (pixels == previous).all(axis=1)
+
+    # The index slot of a pixel holds the last earlier pixel with its hash
+    # (all slots start as 0, 0, 0, 0). Every pixel leaves itself in its slot,
+    # except a run at the very start, which never touches the index.
+    hashes = (pixels[:, 0] * 3 + pixels[:, 1] * 5 + pixels[:, 2] * 7 + pixels[:, 3] * 11) % 64
+    groups = np.where(np.logical_and.accumulate(repeat), -1, hashes)
+    order = np.argsort(groups, kind='stable')
+    last_same = np.full(count, -1)
+    same_group = groups[order[1:]] == groups[order[:-1]]
+    last_same[order[1:][same_group]] = order[:-1][same_group]
+    slot = np.where(last_same[:, np.newaxis] >= 0, pixels[np.maximum(last_same, 0)], 0)
+    hit = ~repeat & (slot == pixels).all(axis=1)
+
+    diff = (pixels[:, :3] - previous[:, :3] + 128) % 256 - 128
+    same_alpha = pixels[:, 3] == previous[:, 3]
+    small = same_alpha & ~hit & ((diff >= -2) & (diff <= 1)).all(axis=1)
+    luma_r = (diff[:, 0] - diff[:, 1] + 128) % 256 - 128
+    luma_b = (diff[:, 2] - diff[:, 1] + 128) % 256 - 128
+    luma = (same_alpha & ~small & (diff[:, 1] >= -32) & (diff[:, 1] <= 31)
+            & (luma_r >= -8) & (luma_r <= 7) & (luma_b >= -8) & (luma_b <= 7))
+    rgb = same_alpha & ~small & ~luma
+
+    # Up to five bytes per pixel; the chunk of a pixel is the first `length`
+    chunks = np.zeros((count, 5), dtype=np.int32)
+    length = np.zeros(count, dtype=np.intp)
+    chunks[:, 0] = 0xFF
+    chunks[:, 1:] = pixels
+    length[:] = 5
+    chunks[rgb, 0] = 0xFE
+    length[rgb] = 4
+    chunks[luma, 0] = 0x80 | (diff[luma, 1] + 32)
+    chunks[luma, 1] = ((luma_r[luma] + 8) << 4) | (luma_b[luma] + 8)
+    length[luma] = 2
+    chunks[small, 0] = 0x40 | ((diff[small, 0] + 2) << 4) | ((diff[small, 1] + 2) << 2) | (diff[small, 2] + 2)
+    length[small] = 1
+    chunks[hit, 0] = hashes[hit]
+    length[hit] = 1
+
+    # Repeated pixels form runs of at most 62, each written as one byte at
+    # its last pixel
+    run_start = np.where(~repeat, np.arange(count), -1)
+    np.maximum.accumulate(run_start, out=run_start)
+    position = np.arange(count) - run_start - 1
+    run_end = repeat & ((position % 62 == 61) | np.append(~repeat[1:], True))
+    length[repeat] = 0
+    chunks[run_end, 0] = 0xC0 | (position[run_end] % 62)
+    length[run_end] = 1
+
+    header = b'qoif' + width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + bytes((channels, 0))
+    body = chunks[np.arange(5) < length[:, np.newaxis]].astype(np.uint8).tobytes()
+    return header + body + b'\x00' * 7 + b'\x01'
+
+def save_image(image, output_path, compress_level=DEFAULT_COMPRESS_LEVEL, scale=1, image_format=None):
+    # Write a converted image losslessly in the format of output_path. PNGs
+    # are palette-indexed whenever the image has at most 256 colors, at the
+    # smallest bit depth that fits, which makes them several times smaller.
+    # output_path may also be a binary file object when image_format names
+    # one of OUTPUT_FORMATS.
+    pil_format = image_format.upper() if image_format else None
+    image_format = image_format or output_format(output_path)
+
+    # Colors are counted before enlarging, once per result pixel rather than
+    # once per pixel of every block
+    indexed = None
+    if image_format == 'png':
+        indexed = indexed_image(image)
+    elif image_format == 'gif':
+        indexed = gif_image(image)
+    image = upscale_image(image if indexed is None else indexed, scale)
+
+    if image_format == 'qoi':
+        data = encode_qoi(np.asarray(image.convert('RGBA' if image.mode == 'RGBA' else 'RGB')))
+        if hasattr(output_path, 'write'):
+            output_path.write(data)
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+    elif image_format == 'webp':
+        # method is libwebp's effort from 0 to 6; exact keeps the color of
+        # transparent pixels
+        image.save(output_path, 'WEBP', lossless=True, quality=100, method=round(compress_level * 6 / 9), exact=True)
+    elif image_format == 'png':
+        if indexed is not None:
+            image.save(output_path, 'PNG', compress_level=compress_level, bits=palette_bits(image))
+        else:
+            image.save(output_path, 'PNG', compress_level=compress_level)
+    elif image_format == 'gif':
+        image.save(output_path, 'GIF')
+    else:
+        image.save(output_path, pil_format)
+    return image.size
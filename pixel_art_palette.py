@@ -0,0 +1,233 @@
+import hashlib
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from PIL import Image
+import numpy as np
+
+# A limited palette: name for display and an (n, 3) uint8 array of RGB colors
+Palette = namedtuple("Palette", ["name", "colors"])
+
+BUILTIN_PALETTES = {
+    'pico8': [
+        '000000', '1d2b53', '7e2553', '008751', 'ab5236', '5f574f', 'c2c3c7', 'fff1e8',
+        'ff004d', 'ffa300', 'ffec27', '00e436', '29adff', '83769c', 'ff77a8', 'ffccaa',
+    ],
+    'db32': [
+        '000000', '222034', '45283c', '663931', '8f563b', 'df7126', 'd9a066', 'eec39a',
+        'fbf236', '99e550', '6abe30', '37946e', '4b692f', '524b24', '323c39', '3f3f74',
+        '306082', '5b6ee1', '639bff', '5fcde4', 'cbdbfc', 'ffffff', '9badb7', '847e87',
+        '696a6a', '595652', '76428a', 'ac3232', 'd95763', 'd77bba', '8f974a', '8a6f30',
+    ],
+    'gameboy': ['0f380f', '306230', '8bac0f', '9bbc0f'],
+}
+
+# Palettes are mapped through a full 256x256x256 table of palette indices,
+# so at most 256 colors fit in the uint8 entries
+MAX_PALETTE_COLORS = 256
+
+# Bump when the table layout or color distance changes so stale caches are ignored
+LUT_VERSION = 1
+
+# Images with at least this many pixels build the lookup table when it is not
+# cached yet; smaller ones search their distinct colors directly
+LUT_MIN_PIXELS = 1 << 20
+
+# Tables already loaded in this process, by palette key
+_lut_cache = {}
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pixel_art_converter')
+
+def parse_hex_colors(values):
+    colors = []
+    for value in values:
+        value = value.strip().lstrip('#')
+        if len(value) == 8:
+            # Lospec .hex files may carry an alpha byte; palettes are opaque
+            value = value[-6:] if value.lower().startswith('ff') else value[:6]
+        if len(value) != 6:
+            raise ValueError(f"invalid color {value!r}")
+        colors.append(tuple(int(value[i:i + 2], 16) for i in (0, 2, 4)))
+    return colors
+
+def read_hex(file_path):
+    with open(file_path) as f:
+        lines = [line.split(';')[0].strip() for line in f]
+    return parse_hex_colors(line for line in lines if line)
+
+def read_gpl(file_path):
+    # GIMP palette: a "GIMP Palette" header, optional Name/Columns lines,
+    # '#' comments, then one "R G B [name]" entry per line
+    colors = []
+    with open(file_path) as f:
+        header = f.readline().strip()
+        if header != 'GIMP Palette':
+            raise ValueError(f"{file_path} is not a GIMP palette")
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or ':' in line.split()[0]:
+                continue
+            colors.append(tuple(int(v) for v in line.split()[:3]))
+    return colors
+
+def make_palette(name, colors):
+    colors = np.array(colors, dtype=np.uint8).reshape(-1, 3)
+    if len(colors) == 0:
+        raise ValueError(f"palette {name!r} has no colors")
+    if len(colors) > MAX_PALETTE_COLORS:
+        raise ValueError(f"palette {name!r} has {len(colors)} colors, at most {MAX_PALETTE_COLORS} are supported")
+    return Palette(name, colors)
+
+@lru_cache(maxsize=16)
+def load_palette(spec):
+    # A built-in palette name, or the path to a .gpl or .hex palette file
+    if spec in BUILTIN_PALETTES:
+        return make_palette(spec, parse_hex_colors(BUILTIN_PALETTES[spec]))
+
+    extension = os.path.splitext(spec)[1].lower()
+    if extension == '.gpl':
+        colors = read_gpl(spec)
+    elif extension in ('.hex', '.txt'):
+        colors = read_hex(spec)
+    else:
+        raise ValueError(f"unknown palette {spec!r}, expected one of {', '.join(BUILTIN_PALETTES)} "
+                         f"or a .gpl/.hex file")
+    return make_palette(os.path.basename(spec), colors)
+
+def palette_key(palette):
+    return hashlib.sha1(palette.colors.tobytes()).hexdigest()[:16]
+
+# sRGB (D65) to CIE XYZ, with rows pre-divided by the D65 white point
+_XYZ_MATRIX = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+]) / np.array([[0.95047], [1.0], [1.08883]])
+
+def srgb_to_linear(values):
+    values = np.asarray(values, dtype=np.float64) / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+# Linear value of every 8-bit channel level, shared by all conversions
+_LINEAR = srgb_to_linear(np.arange(256))
+
+def linear_to_lab(linear):
+    # (..., 3) linear RGB to CIE L*a*b*; perceptual distance is Euclidean here
+    xyz = linear @ _XYZ_MATRIX.T
+    delta = 6 / 29
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz), xyz / (3 * delta ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16,
+                     500 * (f[..., 0] - f[..., 1]),
+                     200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+def rgb_to_lab(rgb):
+    return linear_to_lab(_LINEAR[np.asarray(rgb)])
+
+def nearest_indices(palette_lab, lab, chunk=65536):
+    # Index of the closest palette color for every (n, 3) Lab value. The
+    # squared distance |x - p|^2 is ranked as |p|^2 - 2 x.p, which is one
+    # matrix product; chunks keep the (n, palette) matrix small.
+    weights = -2 * palette_lab.T
+    bias = (palette_lab ** 2).sum(axis=1)
+    indices = np.empty(len(lab), dtype=np.uint8)
+    for start in range(0, len(lab), chunk):
+        indices[start:start + chunk] = np.argmin(lab[start:start + chunk] @ weights + bias, axis=-1)
+    return indices
+
+def build_lut(palette):
+    # Nearest palette index for every 24-bit color, one red plane at a time
+    # so the distance matrix stays small
+    palette_lab = rgb_to_lab(palette.colors)
+    lut = np.empty((256, 256, 256), dtype=np.uint8)
+    green_blue = _LINEAR[np.stack(np.meshgrid(np.arange(256), np.arange(256), indexing='ij'), axis=-1)]
+    linear = np.empty((256, 256, 3))
+    linear[..., 1:] = green_blue
+    for red in range(256):
+        linear[..., 0] = _LINEAR[red]
+        lut[red] = nearest_indices(palette_lab, linear_to_lab(linear).reshape(-1, 3)).reshape(256, 256)
+    return lut
+
+def lut_path(palette, cache_dir=None):
+    directory = os.path.join(cache_dir or default_cache_dir(), 'palettes')
+    return os.path.join(directory, f"{palette_key(palette)}-v{LUT_VERSION}.npy")
+
+def cached_lut(palette, cache_dir=None):
+    # Lookup table already loaded in this process or on disk (memory-mapped), or None
+    key = palette_key(palette)
+    if key not in _lut_cache:
+        try:
+            _lut_cache[key] = np.load(lut_path(palette, cache_dir), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+    return _lut_cache[key]
+
+def palette_lut(palette, cache_dir=None):
+    # Lookup table for a palette, built once and written to the on-disk cache
+    # so later runs and other worker processes only have to map the file
+    lut = cached_lut(palette, cache_dir)
+    if lut is not None:
+        return lut
+
+    lut = build_lut(palette)
+    path = lut_path(palette, cache_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a private name first so concurrent workers never read
+        # a half-written table
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, lut)
+        os.replace(temp_path, path)
+    except OSError:
+        pass  # Read-only cache; keep using the in-memory table
+
+    _lut_cache[palette_key(palette)] = lut
+    return lut
+
+def adaptive_palette(img_array, colors):
+    # Palette of up to `colors` colors chosen for this image by median cut over
+    # its visible pixels
+    pixels = img_array.reshape(-1, img_array.shape[-1])
+    if pixels.shape[1] == 4:
+        pixels = pixels[pixels[:, 3] > 0]
+    pixels = np.ascontiguousarray(pixels[:, :3])
+    if len(pixels) == 0:
+        return make_palette(f"adaptive {colors}", [(0, 0, 0)])
+
+    strip = Image.fromarray(pixels.reshape(1, -1, 3), 'RGB')
+    quantized = strip.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+    entries = quantized.getpalette()
+    palette_colors = [entries[3 * index:3 * index + 3] for _, index in quantized.getcolors(colors)]
+    return make_palette(f"adaptive {colors}", palette_colors)
+
+def quantize_array(img_array, palette, use_lut=None):
+    # Replace every color by the perceptually nearest palette color (in Lab);
+    # alpha is kept as is. With a lookup table mapping is a single gather,
+    # otherwise the distinct colors of the image are searched. By default the
+    # table is used when it is already cached, or built when the image is big
+    # enough to pay for it.
+    if img_array.ndim != 3 or img_array.shape[2] not in (3, 4):
+        raise ValueError("palette quantization needs an RGB or RGBA image")
+
+    rgb = img_array[..., :3]
+    if use_lut is None:
+        lut = cached_lut(palette)
+        if lut is None and rgb.size // 3 >= LUT_MIN_PIXELS:
+            lut = palette_lut(palette)
+    else:
+        lut = palette_lut(palette) if use_lut else None
+
+    if lut is not None:
+        indices = lut[rgb[..., 0], rgb[..., 1], rgb[..., 2]]
+    else:
+        keys = (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        unique_rgb = np.stack([unique_keys >> 16, (unique_keys >> 8) & 0xFF, unique_keys & 0xFF], axis=-1)
+        indices = nearest_indices(rgb_to_lab(palette.colors), rgb_to_lab(unique_rgb))[inverse.reshape(keys.shape)]
+
+    output_array = img_array.copy()
+    output_array[..., :3] = palette.colors[indices]
+    return output_array
@@ -0,0 +1,137 @@
+import contextlib
+import json
+import os
+import time
+from collections import namedtuple
+
+# Environment variables that switch instrumentation on when the matching
+# command-line option is not given
+TIMINGS_ENV = 'PIXEL_ART_TIMINGS'
+PROFILE_ENV = 'PIXEL_ART_PROFILE'
+
+TIMING_FORMATS = ('table', 'jsonl')
+PROFILERS = ('cprofile', 'tracemalloc')
+
+# What to collect per converted image: stage timings always, plus an optional
+# profiler. cProfile statistics accumulate per process in
+# profile_dir/pixel_art-<pid>.pstats; tracemalloc adds each image's peak.
+Profiling = namedtuple("Profiling", ["profiler", "profile_dir"])
+
+# Timings of the conversion running in this process, or None when not measuring
+_current = None
+_profiler = None
+
+# Returned by stage() when nothing is measured, so instrumented code costs one
+# global lookup and an empty with-block
+_NOT_MEASURED = contextlib.nullcontext()
+
+class Timings:
+    # Seconds spent in each named stage of one conversion; a stage entered
+    # more than once (e.g. once per strip) accumulates
+    def __init__(self):
+        self.stages = {}
+        self.total = 0.0
+        self.peak_bytes = None
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record(self):
+        record = {'total': round(self.total, 6), 'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()}}
+        if self.peak_bytes is not None:
+            record['peak_bytes'] = self.peak_bytes
+        return record
+
+class StageTimer:
+    __slots__ = ('timings', 'name', 'start')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+
+def stage(name):
+    # with stage('decode'): ... adds the time spent to the running measurement
+    if _current is None:
+        return _NOT_MEASURED
+    return StageTimer(_current, name)
+
+@contextlib.contextmanager
+def measuring(profiling):
+    # Measures the conversion run inside the with-block and yields its Timings,
+    # or yields None and measures nothing when profiling is None
+    global _current, _profiler
+    if profiling is None:
+        yield None
+        return
+
+    timings = Timings()
+    if profiling.profiler == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+    elif profiling.profiler == 'cprofile' and _profiler is None:
+        import cProfile
+        _profiler = cProfile.Profile()
+
+    _current = timings
+    start = time.perf_counter()
+    try:
+        if profiling.profiler == 'cprofile':
+            _profiler.enable()
+        yield timings
+    finally:
+        if profiling.profiler == 'cprofile':
+            _profiler.disable()
+        timings.total = time.perf_counter() - start
+        _current = None
+        if profiling.profiler == 'tracemalloc':
+            timings.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        elif profiling.profiler == 'cprofile':
+            # Rewritten after every image, so the file is complete whenever
+            # the worker process goes away
+            _profiler.dump_stats(os.path.join(profiling.profile_dir or '.', f"pixel_art-{os.getpid()}.pstats"))
+
+def jsonl_line(result):
+    # One image of a batch as a JSON line
+    record = {'input': result.input_path, 'output': result.output_path, 'error': result.error}
+    if result.timings is None:
+        record['cached'] = result.error is None
+    else:
+        record.update(result.timings)
+    return json.dumps(record)
+
+class TimingSummary:
+    # Running per-stage totals over a batch; keeps no per-image data, so it
+    # works for runs of any length
+    def __init__(self):
+        self.images = 0
+        self.total = 0.0
+        self.stages = {}
+        self.peak_bytes = None
+
+    def add(self, record):
+        self.images += 1
+        self.total += record['total']
+        for name, seconds in record['stages'].items():
+            count, total = self.stages.get(name, (0, 0.0))
+            self.stages[name] = (count + 1, total + seconds)
+        if 'peak_bytes' in record:
+            self.peak_bytes = max(self.peak_bytes or 0, record['peak_bytes'])
+
+    def table(self):
+        # Stages as rows, slowest first, with their share of the measured time
+        lines = [f"{'stage':<12} {'images':>8} {'total s':>10} {'mean ms':>10} {'share':>7}"]
+        for name, (count, total) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            share = total / self.total * 100 if self.total else 0.0
+            lines.append(f"{name:<12} {count:>8} {total:>10.3f} {total / count * 1000:>10.2f} {share:>6.1f}%")
+        mean = self.total / self.images * 1000 if self.images else 0.0
+        lines.append(f"{'total':<12} {self.images:>8} {self.total:>10.3f} {mean:>10.2f}")
+        if self.peak_bytes is not None:
+            lines.append(f"largest traced peak: {self.peak_bytes / (1 << 20):.1f} MB")
+        return lines
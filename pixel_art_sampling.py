@@ -0,0 +1,277 @@
+import numpy as np
+
+# Ways of turning one grid cell into one output pixel
+SAMPLING_MODES = ('center', 'mean', 'median', 'mode', 'trimmed')
+
+# Source rows sampled per step when sample_grid works in bands. Reducers
+# always do, so their per-pixel temporaries (several times the size of the
+# pixels they cover) stay bounded on big images.
+BAND_ROWS = 256
+
+# Fraction of the darkest and of the brightest values dropped per channel by
+# the trimmed mean (0.25 averages the middle half of each cell)
+TRIM_FRACTION = 0.25
+
+def cell_centers(length, pitch, offset):
+    # Source pixel index at the center of every whole cell along one axis.
+    # pitch and offset may be fractional; each center is computed from its own
+    # cell index rather than by stepping, so rounding error never accumulates.
+    # A last cell that overhangs the edge by under half a pixel still counts,
+    # which only matters for fractional grids.
+    count = max(0, int((length - offset + 0.5) // pitch))
+    centers = np.floor(offset + (np.arange(count) + 0.5) * pitch).astype(np.intp)
+
+    # Ensure coordinates are within bounds
+    return np.clip(centers, 0, length - 1)
+
+def cell_edges(length, pitch, offset, lo=0, hi=None):
+    # First source pixel of every cell along one axis, for drawing grid lines.
+    # With lo/hi only the edges in [lo, hi] are computed, so drawing the part
+    # of a grid that is on screen costs nothing for the rest of it.
+    count = max(0, int(np.ceil((length - offset) / pitch)))
+    first = min(count, max(0, int((lo - offset) // pitch)))
+    last = count if hi is None else min(count, max(first, int((hi - offset) // pitch) + 1))
+    edges = np.ceil(offset + np.arange(first, last) * pitch).astype(np.intp)
+    if lo > 0 or hi is not None:
+        edges = edges[(edges >= lo) & (edges <= (length if hi is None else hi))]
+    return edges
+
+def cell_windows(length, pitch, offset, count):
+    # (count, width) source pixel indices of the block reduced for each cell
+    # along one axis. The block is the floor(pitch) pixels whose centers lie
+    # closest to the cell center, which for whole-pixel grids is the cell itself.
+    width = max(1, int(pitch))
+    centers = offset + (np.arange(count) + 0.5) * pitch
+    starts = np.ceil(centers - width / 2 - 0.5).astype(np.intp)
+    return np.clip(starts[:, np.newaxis] + np.arange(width), 0, length - 1)
+
+def axis_index(length, pitch, offset, sampling):
+    # Source pixel indices that the output pixels are computed from along one
+    # axis: a (cells,) array of centers for center sampling, otherwise
+    # (cells, block) windows. Computing these once for the whole image lets a
+    # horizontal strip be sampled with exactly the same pixels.
+    centers = cell_centers(length, pitch, offset)
+    if sampling == 'center':
+        return centers
+    return cell_windows(length, pitch, offset, len(centers))
+
+def index_slice(index):
+    # The slice that selects the same pixels as a 1-D index array of evenly
+    # spaced, increasing positions (as whole-pixel grids have), or None
+    if len(index) < 2:
+        return slice(int(index[0]), int(index[0]) + 1) if len(index) else None
+    step = int(index[1] - index[0])
+    if step <= 0 or not np.array_equal(index, np.arange(index[0], index[0] + step * len(index), step)):
+        return None
+    return slice(int(index[0]), int(index[-1]) + 1, step)
+
+def is_consecutive(index):
+    # True when the windows tile a run of consecutive pixels, as they do for
+    # whole-pixel grids
+    return index.size == 0 or np.array_equal(index.ravel(), np.arange(index[0, 0], index[0, 0] + index.size))
+
+def cell_blocks(img_array, row_index, col_index):
+    # Pixels of every cell as a (rows, block_height, cols, block_width, channels)
+    # array. Whole-pixel grids reshape the cropped image as a view; fractional
+    # grids gather their (equally sized) blocks with one fancy-indexing pass.
+    rows, block_height = row_index.shape
+    cols, block_width = col_index.shape
+    if is_consecutive(row_index) and is_consecutive(col_index):
+        y0 = row_index[0, 0] if rows else 0
+        x0 = col_index[0, 0] if cols else 0
+        cropped = img_array[y0:y0 + row_index.size, x0:x0 + col_index.size]
+        return cropped.reshape(rows, block_height, cols, block_width, img_array.shape[2])
+
+    return img_array[row_index[:, :, np.newaxis, np.newaxis], col_index[np.newaxis, np.newaxis]]
+
+def flatten_blocks(blocks):
+    # (rows, cols, pixels_per_cell, channels); copies, unlike cell_blocks
+    rows, block_height, cols, block_width, channels = blocks.shape
+    return blocks.transpose(0, 2, 1, 3, 4).reshape(rows, cols, block_height * block_width, channels)
+
+def to_uint8(values):
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+def block_sums(blocks, dtype=np.uint32):
+    # Sum over the pixels of each cell. Reducing the block-row axis first adds
+    # whole contiguous slabs, which is several times faster than reducing both
+    # block axes at once or the short block-column axis first.
+    return blocks.sum(axis=1, dtype=dtype).sum(axis=2)
+
+def reduce_mean(blocks, has_alpha):
+    pixels = blocks.shape[1] * blocks.shape[3]
+    if not has_alpha:
+        return to_uint8(block_sums(blocks) / pixels)
+
+    # Weight colors by alpha so the hidden color of transparent pixels never
+    # bleeds into the cell; alpha itself is a plain average
+    alpha = blocks[..., 3:]
+    weighted = block_sums(blocks[..., :3] * alpha.astype(np.uint16), np.uint64)
+    alpha_sum = block_sums(alpha)
+    color = np.divide(weighted, alpha_sum, out=np.zeros(weighted.shape), where=alpha_sum > 0)
+    return to_uint8(np.concatenate([color, alpha_sum / pixels], axis=-1))
+
+def sorted_colors(flat, has_alpha):
+    # Per-channel sorted values and the number of pixels that count toward the
+    # color of each cell. Colors of fully transparent pixels are moved past the
+    # end of the sort (value 256) so they are ignored.
+    values = flat.astype(np.uint16)
+    if has_alpha:
+        transparent = flat[..., 3] == 0
+        values[..., :3][transparent] = 256
+        counts = np.count_nonzero(~transparent, axis=-1)
+    else:
+        counts = np.full(flat.shape[:2], flat.shape[2])
+    values.sort(axis=2)
+    return values, counts
+
+def merge_alpha(color, flat, has_alpha, reducer):
+    # Alpha is reduced over every pixel of the cell with the same reducer
+    if not has_alpha:
+        return to_uint8(color)
+    alpha_values = np.sort(flat[..., 3:], axis=2)
+    full = np.full(flat.shape[:2], flat.shape[2])
+    alpha = reducer(alpha_values.astype(np.uint16), full)
+    return to_uint8(np.concatenate([color[..., :3], alpha], axis=-1))
+
+def median_of_sorted(values, counts):
+    # Average of the two middle values among the first counts entries
+    counts = np.maximum(counts, 1)[..., np.newaxis, np.newaxis]
+    low = np.take_along_axis(values, (counts - 1) // 2, axis=2)
+    high = np.take_along_axis(values, counts // 2, axis=2)
+    return ((low + high) / 2.0)[:, :, 0]
+
+def trimmed_of_sorted(values, counts):
+    # Mean of the sorted values left after trimming TRIM_FRACTION off each end
+    values = np.where(values > 255, 0, values)
+    cumulative = np.concatenate([np.zeros(values.shape[:2] + (1, values.shape[3]), dtype=np.uint32),
+                                 np.cumsum(values, axis=2, dtype=np.uint32)], axis=2)
+    trim = (counts * TRIM_FRACTION).astype(np.intp)
+    low = trim[..., np.newaxis, np.newaxis]
+    high = np.maximum(counts - trim, trim + 1)[..., np.newaxis, np.newaxis]
+    total = (np.take_along_axis(cumulative, high, axis=2) - np.take_along_axis(cumulative, low, axis=2))[:, :, 0]
+    return total / (high - low)[:, :, 0]
+
+def reduce_median(blocks, has_alpha):
+    flat = flatten_blocks(blocks)
+    values, counts = sorted_colors(flat, has_alpha)
+    color = median_of_sorted(values, counts)
+    color[counts == 0] = 0
+    return merge_alpha(color, flat, has_alpha, median_of_sorted)
+
+def reduce_trimmed(blocks, has_alpha):
+    flat = flatten_blocks(blocks)
+    values, counts = sorted_colors(flat, has_alpha)
+    color = trimmed_of_sorted(values, counts)
+    return merge_alpha(color, flat, has_alpha, trimmed_of_sorted)
+
+def reduce_mode(blocks, has_alpha):
+    # Most frequent color of each cell. Channels are packed into one integer
+    # per pixel, sorted, and the longest run of equal keys wins (ties go to the
+    # smallest key so the result is deterministic).
+    flat = flatten_blocks(blocks)
+    channels = flat.shape[3]
+    if has_alpha:
+        # Every fully transparent pixel is the same color
+        flat = flat * (flat[..., 3:] > 0)
+
+    keys = np.zeros(flat.shape[:3], dtype=np.uint32)
+    for channel in range(channels):
+        keys |= flat[..., channel].astype(np.uint32) << (8 * channel)
+    keys.sort(axis=2)
+
+    positions = np.arange(keys.shape[2])
+    run_start = np.zeros(keys.shape, dtype=np.intp)
+    run_start[:, :, 1:] = np.where(keys[:, :, 1:] != keys[:, :, :-1], positions[1:], 0)
+    np.maximum.accumulate(run_start, axis=2, out=run_start)
+    run_length = positions - run_start
+    best = np.argmax(run_length, axis=2)[..., np.newaxis]
+    mode_keys = np.take_along_axis(keys, best, axis=2)[:, :, 0]
+
+    shifts = 8 * np.arange(channels, dtype=np.uint32)
+    return ((mode_keys[..., np.newaxis] >> shifts) & 0xFF).astype(np.uint8)
+
+REDUCERS = {
+    'mean': reduce_mean,
+    'median': reduce_median,
+    'mode': reduce_mode,
+    'trimmed': reduce_trimmed,
+}
+
+def sample_cells(img_array, row_index, col_index, sampling='center'):
+    # One output pixel per cell from index arrays made by axis_index; row_index
+    # may be shifted to address a horizontal strip of the source
+    if sampling == 'center':
+        rows = index_slice(row_index)
+        cols = index_slice(col_index)
+        if rows is not None and cols is not None:
+            # Evenly spaced centers are a strided view of the source; only the
+            # output pixels are copied out of it
+            return np.ascontiguousarray(img_array[rows, cols])
+        # Gather the center pixel of every cell with one advanced-indexing pass
+        return img_array[row_index[:, np.newaxis], col_index]
+
+    if sampling not in REDUCERS:
+        raise ValueError(f"unknown sampling mode {sampling!r}, expected one of {', '.join(SAMPLING_MODES)}")
+
+    squeeze = img_array.ndim == 2
+    if squeeze:
+        img_array = img_array[:, :, np.newaxis]
+
+    blocks = cell_blocks(img_array, row_index, col_index)
+    has_alpha = img_array.shape[2] == 4
+    output_array = REDUCERS[sampling](blocks, has_alpha)
+    return output_array[:, :, 0] if squeeze else output_array
+
+def band_limits(row_index, band_rows):
+    # Split the cell rows into bands whose source rows span about band_rows.
+    # Yields (first_cell_row, end_cell_row, first_source_row, end_source_row).
+    windows = row_index.reshape(len(row_index), -1)
+    cells = len(windows)
+    start = 0
+    while start < cells:
+        end = start + 1
+        while end < cells and windows[end].max() + 1 - windows[start].min() <= band_rows:
+            end += 1
+        yield start, end, int(windows[start].min()), int(windows[end - 1].max()) + 1
+        start = end
+
+def sample_grid(img_array, pitch_x, pitch_y, offset_x=0, offset_y=0, sampling='center', progress=None):
+    # Sampling engine behind convert_to_pixel_art: one output pixel per whole
+    # grid cell, computed for the entire grid at once at every grid size
+    img_height, img_width = img_array.shape[:2]
+    row_index = axis_index(img_height, pitch_y, offset_y, sampling)
+    col_index = axis_index(img_width, pitch_x, offset_x, sampling)
+    return sample_indexed(img_array, row_index, col_index, sampling, progress)
+
+def sample_frames(frames_array, pitch_x, pitch_y, offset_x=0, offset_y=0, sampling='center', progress=None):
+    # sample_grid for a (frames, height, width[, channels]) stack of frames
+    # sharing one grid. The stack is sampled as one tall image whose cell rows
+    # repeat every height rows, so all frames go through a single pass; no
+    # cell reaches across a frame boundary. Returns the frames' results stacked
+    # the same way, as a (frames * rows, cols[, channels]) array.
+    frames, img_height, img_width = frames_array.shape[:3]
+    row_index = axis_index(img_height, pitch_y, offset_y, sampling)
+    col_index = axis_index(img_width, pitch_x, offset_x, sampling)
+    starts = (np.arange(frames) * img_height).reshape((frames,) + (1,) * row_index.ndim)
+    stacked_rows = (row_index[np.newaxis] + starts).reshape((-1,) + row_index.shape[1:])
+    tall = frames_array.reshape((frames * img_height,) + frames_array.shape[2:])
+    return sample_indexed(tall, stacked_rows, col_index, sampling, progress)
+
+def sample_indexed(img_array, row_index, col_index, sampling='center', progress=None):
+    # sample_cells over index arrays made by axis_index, in bands of rows
+    # where that is needed
+    if len(row_index) == 0 or (progress is None and sampling == 'center'):
+        return sample_cells(img_array, row_index, col_index, sampling)
+
+    # Same result a band of cell rows at a time, calling progress(fraction)
+    # in between if given; progress may raise to abandon the conversion
+    output_array = None
+    for first, end, top, bottom in band_limits(row_index, BAND_ROWS):
+        band = sample_cells(img_array[top:bottom], row_index[first:end] - top, col_index, sampling)
+        if output_array is None:
+            output_array = np.empty((len(row_index),) + band.shape[1:], dtype=band.dtype)
+        output_array[first:end] = band
+        if progress is not None:
+            progress(end / len(row_index))
+    return output_array
@@ -0,0 +1,416 @@
+import argparse
+import io
+import json
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+from PIL import Image
+
+from pixel_art_batch import default_workers
+from pixel_art_converter import (load_image, image_array, grid_pitch, parse_grid_size, convert_array,
+                                 detect_grid_checked)
+from pixel_art_output import OUTPUT_FORMATS, DEFAULT_COMPRESS_LEVEL, save_image
+from pixel_art_palette import BUILTIN_PALETTES, load_palette, palette_lut
+from pixel_art_profile import Profiling, measuring, stage
+from pixel_art_sampling import SAMPLING_MODES
+
+DEFAULT_PORT = 8765
+
+# Largest accepted upload in MB
+DEFAULT_MAX_UPLOAD = 64
+
+# Bytes read at a time when dropping the upload of a refused request
+READ_CHUNK = 1 << 20
+
+CONTENT_TYPES = {'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp', 'qoi': 'image/qoi'}
+
+# Query parameters of POST /convert, named like the command-line options
+QUERY_PARAMETERS = ('grid-size', 'offset-x', 'offset-y', 'min-confidence', 'sampling', 'palette', 'colors',
+                    'format', 'compress-level', 'scale')
+
+# A finished conversion as sent back by a worker: the encoded image, its
+# size, the grid that was used and the stage timings
+Converted = namedtuple("Converted", ["data", "size", "grid", "offset", "timings"])
+
+def query_number(params, name, convert, default, low=-math.inf, high=math.inf):
+    text = params.get(name)
+    if text is None:
+        return default
+    try:
+        value = convert(text)
+    except ValueError:
+        raise ValueError(f"invalid {name} {text!r}") from None
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low:g} and {high:g}")
+    return value
+
+def request_options(query, palettes):
+    # Conversion options from a query string such as
+    # grid-size=8&sampling=mode&palette=pico8. palettes maps the palette
+    # names clients may ask for to their specs. Raises ValueError naming the
+    # bad parameter.
+    params = dict(parse_qsl(query, keep_blank_values=True))
+    for name in params:
+        if name not in QUERY_PARAMETERS:
+            raise ValueError(f"unknown parameter {name!r}")
+
+    grid_size = params.get('grid-size', 'auto')
+    try:
+        grid_size = parse_grid_size(grid_size)
+    except ValueError:
+        raise ValueError(f"invalid grid-size {grid_size!r}") from None
+    if grid_size != 'auto' and not all(2 <= pitch < math.inf for pitch in grid_pitch(grid_size)):
+        raise ValueError("grid-size must be at least 2")
+
+    sampling = params.get('sampling', 'center')
+    if sampling not in SAMPLING_MODES:
+        raise ValueError(f"sampling must be one of {', '.join(SAMPLING_MODES)}")
+    image_format = params.get('format', 'png')
+    if image_format not in OUTPUT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(OUTPUT_FORMATS)}")
+    palette = params.get('palette')
+    if palette is not None and palette not in palettes:
+        raise ValueError(f"palette must be one of {', '.join(palettes)}")
+    colors = query_number(params, 'colors', int, None, 1, 256)
+    if palette is not None and colors is not None:
+        raise ValueError("palette and colors cannot be combined")
+
+    return {
+        'grid_size': grid_size,
+        'grid_offset_x': query_number(params, 'offset-x', float, 0.0),
+        'grid_offset_y': query_number(params, 'offset-y', float, 0.0),
+        'min_confidence': query_number(params, 'min-confidence', float, 0.5, 0, 1),
+        'sampling': sampling,
+        'palette': palettes[palette] if palette is not None else None,
+        'colors': colors,
+        'format': image_format,
+        'compress_level': query_number(params, 'compress-level', int, DEFAULT_COMPRESS_LEVEL, 0, 9),
+        'scale': query_number(params, 'scale', int, 1, 1, 64),
+    }
+
+def warm_worker(palettes):
+    # Pool initializer: decode every served palette and map its lookup table
+    # once, so requests find both in this process's caches. Ctrl+C is left to
+    # the server, which shuts the workers down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Image.init()
+    for spec in palettes:
+        palette_lut(load_palette(spec))
+
+def worker_pid():
+    return os.getpid()
+
+def convert_upload(data, options):
+    # Runs in a worker process: converts the first frame of an uploaded image
+    # and encodes the result in memory
+    with measuring(Profiling(None, None)) as timings:
+        try:
+            image = load_image(io.BytesIO(data))
+        except Image.UnidentifiedImageError:
+            raise ValueError("upload is not an image in a supported format") from None
+        mode = image.mode
+        with stage('to_array'):
+            img_array = image_array(image)
+        image.close()
+        del image
+
+        grid_size = options['grid_size']
+        grid_offset_x, grid_offset_y = options['grid_offset_x'], options['grid_offset_y']
+        if grid_size == 'auto':
+            grid_size, grid_offset_x, grid_offset_y = detect_grid_checked(img_array, options['min_confidence'])
+        pixel_art = convert_array(img_array, mode, grid_size, grid_offset_x, grid_offset_y, options['sampling'],
+                                  options['palette'], options['colors'])
+        del img_array
+
+        buffer = io.BytesIO()
+        with stage('save'):
+            size = save_image(pixel_art, buffer, options['compress_level'], options['scale'], options['format'])
+    return Converted(buffer.getvalue(), size, grid_pitch(grid_size), (grid_offset_x, grid_offset_y), timings.record())
+
+class WorkerPool:
+    # Worker processes that stay up between requests, keeping Pillow, NumPy
+    # and the palette tables loaded. If a worker dies the pool is replaced.
+    def __init__(self, workers, palettes=()):
+        self.workers = workers
+        self.palettes = tuple(palettes)
+        self.lock = threading.Lock()
+        self.executor = None
+        self.start()
+
+    def start(self):
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker, initargs=(self.palettes,))
+        # Workers are started on demand; one task each starts and warms them
+        # before the first request
+        for future in [executor.submit(worker_pid) for _ in range(self.workers)]:
+            future.result()
+        self.executor = executor
+
+    def run(self, function, *args):
+        executor = self.executor
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:
+                    executor.shutdown(wait=False)
+                    self.start()
+            raise
+
+    def close(self):
+        self.executor.shutdown()
+
+class ConversionServer(ThreadingHTTPServer):
+    # HTTP front end of a WorkerPool. At most max_in_flight conversions are
+    # queued or running at once; a request that finds no free slot within
+    # queue_timeout seconds is answered 503 without being converted.
+    daemon_threads = True
+    # Room for bursts of clients connecting at once; with the default of 5
+    # further connection attempts are dropped and retried a second later
+    request_queue_size = 128
+
+    def __init__(self, address, pool, palettes, max_in_flight, queue_timeout=0.0,
+                 max_upload_bytes=DEFAULT_MAX_UPLOAD << 20, quiet=False):
+        super().__init__(address, ConversionHandler)
+        self.pool = pool
+        self.palettes = palettes
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.max_upload_bytes = max_upload_bytes
+        self.quiet = quiet
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.served = 0
+        self.rejected = 0
+
+    def count(self, name, change=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + change)
+
+    def status(self):
+        with self.lock:
+            return {
+                'workers': self.pool.workers,
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self.in_flight,
+                'served': self.served,
+                'rejected': self.rejected,
+                'palettes': sorted(self.palettes),
+            }
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    # POST /convert?<options> with the image file as the request body returns
+    # the converted image; GET /health returns the server status as JSON
+    server_version = 'pixel_art_server'
+    # Keep-alive, so clients can reuse their connection
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; with Nagle's algorithm on, the
+    # body would wait for the client's delayed ACK of the headers (~40 ms)
+    disable_nagle_algorithm = True
+
+    def send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_text(self, status, message, headers=(), unread_body=False):
+        # A request whose body was not read cannot be followed by another on
+        # the same connection
+        if unread_body:
+            headers = tuple(headers) + (('Connection', 'close'),)
+        self.send(status, f"{message}\n".encode(), 'text/plain; charset=utf-8', headers)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/health':
+            self.send_error_text(404, "not found")
+            return
+        self.send(200, json.dumps(self.server.status()).encode(), 'application/json')
+
+    def discard_body(self, length):
+        # Read and drop up to length bytes of the upload; False if the client
+        # stopped sending first
+        while length > 0:
+            chunk = self.rfile.read(min(length, READ_CHUNK))
+            if not chunk:
+                return False
+            length -= len(chunk)
+        return True
+
+    def admit(self, body_sent):
+        # Checks a conversion request from its request line and headers and
+        # takes a conversion slot for it. Returns (options, length), or None
+        # after answering it. When the client has already sent the upload it
+        # is read first (up to the size limit), so the client gets the answer
+        # rather than a reset connection.
+        length = self.headers.get('Content-Length', '')
+        if not length.isdigit():
+            self.send_error_text(411, "Content-Length required", unread_body=True)
+            return None
+        length = int(length)
+
+        def refuse(status, message, headers=()):
+            complete = body_sent and length <= self.server.max_upload_bytes and self.discard_body(length)
+            self.send_error_text(status, message, headers, unread_body=not complete)
+            return None
+
+        url = urlsplit(self.path)
+        if url.path != '/convert':
+            return refuse(404, "not found")
+        try:
+            options = request_options(url.query, self.server.palettes)
+        except ValueError as e:
+            return refuse(400, str(e))
+        if length == 0:
+            return refuse(400, "no image uploaded")
+        if length > self.server.max_upload_bytes:
+            return refuse(413, f"upload is larger than {self.server.max_upload_bytes >> 20} MB")
+        if not self.server.slots.acquire(timeout=self.server.queue_timeout):
+            self.server.count('rejected')
+            return refuse(503, "too many conversions in progress", (('Retry-After', '1'),))
+        return options, length
+
+    def handle_expect_100(self):
+        # Clients that send "Expect: 100-continue" are refused before they
+        # upload anything
+        self.admitted = self.admit(body_sent=False) if self.command == 'POST' else None
+        if self.command == 'POST' and self.admitted is None:
+            return False
+        try:
+            return super().handle_expect_100()
+        except Exception:
+            if self.admitted is not None:
+                self.server.slots.release()
+            raise
+
+    def do_POST(self):
+        start = time.perf_counter()
+        admitted, self.admitted = getattr(self, 'admitted', None), None
+        if admitted is None:
+            admitted = self.admit(body_sent=True)
+            if admitted is None:
+                return
+        options, length = admitted
+
+        self.server.count('in_flight')
+        try:
+            data = self.rfile.read(length)
+            if len(data) < length:
+                self.close_connection = True
+                return
+            try:
+                converted = self.server.pool.run(convert_upload, data, options)
+            except BrokenProcessPool:
+                self.send_error_text(500, "worker process died")
+                return
+            except Exception as e:
+                self.send_error_text(422, f"{type(e).__name__}: {e}")
+                return
+        finally:
+            self.server.count('in_flight', -1)
+            self.server.slots.release()
+
+        self.server.count('served')
+        width, height = converted.size
+        pitch_x, pitch_y = converted.grid
+        timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in converted.timings['stages'].items()]
+        timings.append(f"total;dur={(time.perf_counter() - start) * 1000:.2f}")
+        self.send(200, converted.data, CONTENT_TYPES[options['format']], (
+            ('X-Pixel-Art-Size', f"{width}x{height}"),
+            ('X-Grid-Size', f"{pitch_x:g}x{pitch_y:g}"),
+            ('X-Grid-Offset', f"{converted.offset[0]:g},{converted.offset[1]:g}"),
+            ('Server-Timing', ", ".join(timings)),
+        ))
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+def served_palettes(files):
+    # Palette names clients may ask for: the built-in palettes and the given
+    # palette files, by file name without extension
+    palettes = {name: name for name in BUILTIN_PALETTES}
+    for spec in files:
+        palettes[os.path.splitext(os.path.basename(spec))[0]] = spec
+    return palettes
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pixel_art_server",
+        description="Serve pixel art conversions over HTTP from a pool of warm worker processes."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"Port to listen on, 0 for any free port (default: {DEFAULT_PORT})")
+    parser.add_argument("-j", "--workers", type=int, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--max-in-flight", type=int,
+                        help="Maximum conversions queued or running at once (default: 4 per worker)")
+    parser.add_argument("--queue-timeout", type=float, default=0.0,
+                        help="Seconds a request may wait for a free slot before it is answered 503 (default: 0)")
+    parser.add_argument("--max-upload", type=int, default=DEFAULT_MAX_UPLOAD,
+                        help=f"Largest accepted upload in MB (default: {DEFAULT_MAX_UPLOAD})")
+    parser.add_argument("-p", "--palette", action="append", default=[],
+                        help="Also serve this .gpl/.hex palette file, under its file name without extension; "
+                             "may be repeated")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not log requests")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.max_in_flight is not None and args.max_in_flight < 1:
+        parser.error("--max-in-flight must be at least 1")
+    if args.queue_timeout < 0:
+        parser.error("--queue-timeout must not be negative")
+    if args.max_upload < 1:
+        parser.error("--max-upload must be at least 1")
+
+    palettes = served_palettes(args.palette)
+    try:
+        # Built (or loaded) here first, so the workers only map the cached tables
+        for spec in palettes.values():
+            palette_lut(load_palette(spec))
+    except (OSError, ValueError) as e:
+        parser.error(f"could not load palette: {e}")
+
+    workers = args.workers or default_workers()
+    pool = WorkerPool(workers, palettes.values())
+    try:
+        server = ConversionServer((args.host, args.port), pool, palettes, args.max_in_flight or workers * 4,
+                                  args.queue_timeout, args.max_upload << 20, args.quiet)
+    except OSError as e:
+        pool.close()
+        print(f"Could not listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Serving on http://{args.host}:{server.server_port}/convert with {workers} workers", file=sys.stderr)
+    # Stopped by a service manager the same way as by Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
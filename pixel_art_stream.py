@@ -0,0 +1,202 @@
+import struct
+import zlib
+
+from PIL import Image
+import numpy as np
+
+from pixel_art_converter import open_unchecked, image_array, normalize_image, normalized_mode, grid_pitch, apply_palette, detect_grid_checked
+from pixel_art_profile import stage
+from pixel_art_sampling import axis_index, band_limits, sample_cells
+
+# Default height of one strip in source rows; peak memory is roughly
+# strip_rows * width * 4 bytes plus the (small) output
+DEFAULT_STRIP_ROWS = 512
+
+# With --grid-size auto the grid is detected on this many leading rows
+DETECT_ROWS = 2048
+
+# Compressed bytes read from the file per step
+READ_SIZE = 1 << 20
+
+class NotStreamable(Exception):
+    pass
+
+class PngStripDecoder:
+    # Decodes a non-interlaced PNG of up to 8 bits per channel from the top,
+    # a few rows at a time, without ever holding the whole image.
+    #
+    # Inflating the IDAT stream is done here; undoing the per-row PNG filters
+    # is left to Pillow's own decoder. Each strip is re-wrapped as a tiny zlib
+    # stream whose first row is the previous, already unfiltered row (stored
+    # with filter type 0), so the Up/Average/Paeth filters of the strip's first
+    # row see exactly the bytes they would in the full image.
+
+    def __init__(self, file_path):
+        # Memory is bounded by the strip height, so images over Pillow's
+        # decompression bomb limit are fine here
+        self.image = open_unchecked(file_path)
+        if self.image.format != 'PNG' or getattr(self.image, 'is_animated', False):
+            raise NotStreamable("not a single-frame PNG")
+        if len(self.image.tile) != 1 or self.image.tile[0][0] != 'zip' or self.image.info.get('interlace'):
+            raise NotStreamable("interlaced or unusual PNG layout")
+
+        self.file = open(file_path, 'rb')
+        header = self.file.read(33)
+        depth, color_type = header[24], header[25]
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+        if depth > 8:
+            raise NotStreamable("16-bit PNG")
+
+        # Bytes per complete pixel as the PNG filters see it, and per row
+        self.bpp = max(1, depth * channels // 8)
+        self.row_bytes = (self.image.width * depth * channels + 7) // 8
+        self.byte_mode = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}[self.bpp]
+        self.rawmode = self.image.tile[0][3]
+        if isinstance(self.rawmode, tuple):
+            self.rawmode = self.rawmode[0]
+
+        # Row -1 is all zeros by definition
+        self.previous = bytes(self.row_bytes + 1)
+        self.inflater = zlib.decompressobj()
+        self.pending = b''
+        self.buffer = bytearray()
+        self.file.seek(8)
+
+    def close(self):
+        self.file.close()
+        self.image.close()
+
+    def read_idat(self):
+        # Next piece of IDAT payload, or b'' at the end of the image data
+        while True:
+            if self.pending:
+                data, self.pending = self.pending[:READ_SIZE], self.pending[READ_SIZE:]
+                return data
+            chunk_header = self.file.read(8)
+            if len(chunk_header) < 8:
+                return b''
+            length, chunk_type = struct.unpack('>I4s', chunk_header)
+            if chunk_type == b'IDAT':
+                self.pending = self.file.read(length)
+                self.file.seek(4, 1)  # CRC
+            elif chunk_type == b'IEND':
+                return b''
+            else:
+                self.file.seek(length + 4, 1)
+
+    def filtered_rows(self, count):
+        # Exactly count filtered rows (filter byte + row bytes each)
+        needed = count * (self.row_bytes + 1)
+        while len(self.buffer) < needed:
+            if self.inflater.unconsumed_tail:
+                data = self.inflater.unconsumed_tail
+            else:
+                data = self.read_idat()
+                if not data:
+                    raise ValueError("PNG image data ends early")
+            self.buffer += self.inflater.decompress(data, needed - len(self.buffer))
+        rows = bytes(self.buffer[:needed])
+        del self.buffer[:needed]
+        return rows
+
+    def read(self, count):
+        # The next count rows as an image in the file's own mode
+        stream = zlib.compress(self.previous + self.filtered_rows(count), 0)
+        size = (self.row_bytes // self.bpp, count + 1)
+        raw = Image.frombytes(self.byte_mode, size, stream, 'zip', self.byte_mode).tobytes()
+        self.previous = b'\0' + raw[-self.row_bytes:]
+
+        strip = Image.frombytes(self.image.mode, (self.image.width, count), raw[self.row_bytes:], 'raw', self.rawmode)
+        if self.image.mode == 'P':
+            strip.putpalette(self.image.palette)
+        if 'transparency' in self.image.info:
+            strip.info['transparency'] = self.image.info['transparency']
+        return strip
+
+    def skip(self, count):
+        # Rows still have to be unfiltered, since later rows depend on them
+        while count > 0:
+            step = min(count, DEFAULT_STRIP_ROWS)
+            self.read(step)
+            count -= step
+
+class InMemoryStrips:
+    # Fallback for formats that Pillow cannot decode in parts: decode once and
+    # hand out views of the decoded array, so at least no copies are made.
+    # This holds the whole image, so Pillow's decompression bomb check stays.
+    def __init__(self, file_path):
+        self.image = Image.open(file_path)
+        self.array = None
+        self.position = 0
+
+    def close(self):
+        self.image.close()
+
+    def read(self, count):
+        if self.array is None:
+            self.array = image_array(normalize_image(self.image))
+            # The array has its own copy of the pixels; free the decoded image
+            self.image.close()
+        strip = self.array[self.position:self.position + count]
+        self.position += count
+        return strip
+
+    def skip(self, count):
+        self.position += count
+
+def open_strips(file_path):
+    try:
+        return PngStripDecoder(file_path)
+    except NotStreamable:
+        return InMemoryStrips(file_path)
+
+def strip_array(decoder, count):
+    strip = decoder.read(count)
+    if isinstance(strip, np.ndarray):
+        return strip
+    return np.asarray(normalize_image(strip))
+
+def convert_file_streaming(input_path, grid_size, grid_offset_x=0, grid_offset_y=0, sampling='center',
+                           palette=None, colors=None, min_confidence=0.0, strip_rows=DEFAULT_STRIP_ROWS):
+    # Same result as convert_to_pixel_art(load_image(input_path), ...), but the
+    # source is decoded and sampled one horizontal band of cells at a time, so
+    # peak memory follows strip_rows rather than the image height
+    with open_unchecked(input_path) as header:
+        width, height = header.size
+        mode = normalized_mode(header.mode)
+
+    if grid_size == 'auto':
+        # Detect on the leading rows; the phase is measured from row 0 either way
+        decoder = open_strips(input_path)
+        try:
+            with stage('decode'):
+                top = Image.fromarray(strip_array(decoder, min(height, DETECT_ROWS)), mode)
+        finally:
+            decoder.close()
+        grid_size, grid_offset_x, grid_offset_y = detect_grid_checked(top, min_confidence)
+        del top
+
+    pitch_x, pitch_y = grid_pitch(grid_size)
+    row_index = axis_index(height, pitch_y, grid_offset_y, sampling)
+    col_index = axis_index(width, pitch_x, grid_offset_x, sampling)
+    channels = len(mode)
+    output_array = np.empty((len(row_index), len(col_index), channels), dtype=np.uint8)
+
+    decoder = open_strips(input_path)
+    try:
+        position = 0
+        for first, end, top_row, bottom_row in band_limits(row_index, max(strip_rows, 1)):
+            with stage('decode'):
+                decoder.skip(top_row - position)
+                band = strip_array(decoder, bottom_row - top_row)
+            position = bottom_row
+            with stage('sample'):
+                output_array[first:end] = sample_cells(band, row_index[first:end] - top_row, col_index, sampling)
+            del band
+    finally:
+        decoder.close()
+
+    with stage('palette'):
+        output_array = apply_palette(output_array, palette, colors)
+    with stage('from_array'):
+        return Image.fromarray(output_array, mode=mode)
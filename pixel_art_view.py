@@ -0,0 +1,166 @@
+import weakref
+from collections import namedtuple, OrderedDict
+
+from PIL import Image
+import numpy as np
+
+from pixel_art_converter import grid_pitch
+from pixel_art_sampling import axis_index, sample_cells
+
+# Default memory budget for cached renders and pyramid levels
+DEFAULT_CACHE_BYTES = 256 << 20
+
+# Source pixels the live preview may read per update. Zoomed-out views of big
+# images sample every n-th cell instead, so an update stays fast at any size.
+PREVIEW_MAX_PIXELS = 1 << 19
+
+# Sampled cells for part of the view: cells[i, j] is cell (first_row + i * stride,
+# first_col + j * stride) of the grid
+PreviewTile = namedtuple("PreviewTile", ["cells", "first_col", "first_row", "stride"])
+
+class RenderCache:
+    # Least-recently-used store of rendered images, bounded by their total
+    # size in bytes. Keys start with the owner key of the source image, and all
+    # entries of an image are dropped as soon as that image is garbage collected.
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.owners = {}
+
+    def owner_key(self, image):
+        key = id(image)
+        if key not in self.owners:
+            self.owners[key] = weakref.finalize(image, self.discard, key)
+        return key
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, image):
+        nbytes = image.width * image.height * len(image.getbands())
+        if nbytes > self.max_bytes:
+            return image
+        self.remove(key)
+        self.entries[key] = (image, nbytes)
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+        return image
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def items(self):
+        # Most recently used first
+        return reversed(list(self.entries.items()))
+
+    def discard(self, owner):
+        for key in [key for key in self.entries if key[0] == owner]:
+            self.remove(key)
+        self.owners.pop(owner, None)
+
+    def clear(self):
+        for owner in list(self.owners):
+            self.owners[owner].detach()
+            self.discard(owner)
+
+def pyramid_level(image, factor, cache):
+    # The image reduced by a power-of-two factor, each level made from the
+    # one above it with a box filter
+    if factor <= 1:
+        return image
+    key = (cache.owner_key(image), 'pyramid', factor)
+    level = cache.get(key)
+    if level is None:
+        level = cache.put(key, pyramid_level(image, factor // 2, cache).reduce(2))
+    return level
+
+def pyramid_factor(image_size, display_size):
+    # Largest power of two the image can be reduced by and still be at least
+    # as large as the display on both axes
+    factor = 1
+    while image_size[0] >= display_size[0] * factor * 2 and image_size[1] >= display_size[1] * factor * 2:
+        factor *= 2
+    return factor
+
+def scaled_region(image, display_size, region, resampling):
+    # region (left, top, right, bottom) of the image scaled to display_size,
+    # without scaling the rest
+    display_width, display_height = display_size
+    img_width, img_height = image.size
+    left, top, right, bottom = region
+
+    # The resampling filter still reads the pixels around the box, so renders
+    # of neighbouring regions line up seamlessly. With NEAREST every screen
+    # pixel shows the source pixel under its center, and only those pixels are
+    # read, however far the image is zoomed out.
+    scale_x = display_width / img_width
+    scale_y = display_height / img_height
+    box = (left / scale_x, top / scale_y, right / scale_x, bottom / scale_y)
+    return image.resize((right - left, bottom - top), resampling, box=box)
+
+def flatten(image):
+    # Transparent images are shown on a white background
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, (0, 0), image)
+    return background
+
+def cached_render(image, display_size, region, resampling, cache):
+    # A cached render that covers region at this display size, as
+    # (rendered_region, image), or None
+    owner = cache.owner_key(image)
+    for key, render in cache.items():
+        if key[:4] != (owner, 'render', display_size, resampling):
+            continue
+        left, top, right, bottom = key[4]
+        if left <= region[0] and top <= region[1] and right >= region[2] and bottom >= region[3]:
+            cache.get(key)
+            return key[4], render
+    return None
+
+def render_region(image, display_size, region, resampling, cache):
+    # Flattened render of region of the image at display_size. Filtered
+    # downscales start from the nearest pyramid level instead of the full
+    # image; NEAREST only reads the pixels it shows, so it needs none.
+    source = image
+    if resampling != Image.Resampling.NEAREST:
+        source = pyramid_level(image, pyramid_factor(image.size, display_size), cache)
+    render = flatten(scaled_region(source, display_size, region, resampling))
+    key = (cache.owner_key(image), 'render', display_size, resampling, tuple(region))
+    return cache.put(key, render)
+
+def overlapping_cells(count, pitch, offset, lo, hi):
+    # Range of cells along one axis that overlap source pixels [lo, hi)
+    first = min(count, max(0, int((lo - offset) // pitch)))
+    end = min(count, max(first, int(np.ceil((hi - offset) / pitch))))
+    return first, end
+
+def preview_cells(img_array, grid_size, offset_x, offset_y, region, sampling='center', max_pixels=PREVIEW_MAX_PIXELS):
+    # The converted result for only the cells overlapping region (left, top,
+    # right, bottom in source pixels), or None if there are none. Cells are the
+    # same as in the full conversion; only which of them are computed differs.
+    img_height, img_width = img_array.shape[:2]
+    pitch_x, pitch_y = grid_pitch(grid_size)
+    row_index = axis_index(img_height, pitch_y, offset_y, sampling)
+    col_index = axis_index(img_width, pitch_x, offset_x, sampling)
+
+    left, top, right, bottom = region
+    first_row, end_row = overlapping_cells(len(row_index), pitch_y, offset_y, top, bottom)
+    first_col, end_col = overlapping_cells(len(col_index), pitch_x, offset_x, left, right)
+    if first_row >= end_row or first_col >= end_col:
+        return None
+
+    per_cell = 1 if sampling == 'center' else row_index.shape[1] * col_index.shape[1]
+    count = (end_row - first_row) * (end_col - first_col)
+    stride = max(1, int(np.ceil(np.sqrt(count * per_cell / max_pixels))))
+    cells = sample_cells(img_array, row_index[first_row:end_row:stride], col_index[first_col:end_col:stride], sampling)
+    return PreviewTile(cells, first_col, first_row, stride)
@@ -0,0 +1,26 @@
+import multiprocessing
+import os
+
+import pytest
+
+import pixel_art_batch
+from pixel_art_batch import convert_batch
+
+def fake_convert_file(input_path, output_path, **options):
+    # Kills its worker process for inputs named crash*, converts the rest
+    if os.path.basename(input_path).startswith('crash'):
+        os._exit(1)
+    return (1, 1)
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason="workers only see the patched convert_file when forked")
+def test_dead_worker_fails_only_its_own_job(monkeypatch):
+    monkeypatch.setattr(pixel_art_batch, 'convert_file', fake_convert_file)
+    jobs = [(f"{'crash' if index in (5, 12) else 'ok'}{index}.png", f"out{index}.png") for index in range(21)]
+
+    results = convert_batch(jobs, {}, workers=2, max_in_flight=4)
+
+    assert sorted(result.input_path for result in results) == sorted(input_path for input_path, _ in jobs)
+    failed = sorted(result.input_path for result in results if result.error)
+    assert failed == ['crash12.png', 'crash5.png']
+    assert all('BrokenProcessPool' in result.error for result in results if result.error)
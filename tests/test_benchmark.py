@@ -0,0 +1,9 @@
+import pytest
+
+from pixel_art_benchmark import run_case, inexact
+from pixel_art_palette import load_palette
+
+@pytest.mark.parametrize('scale', (2.5, 3, 4, 7.5, 10.67))
+def test_clean_cases_are_exact_in_every_mode(scale):
+    case = run_case(128, scale, 'clean', 1, load_palette('pico8'))
+    assert inexact({'cases': [case]}) == []
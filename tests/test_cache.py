@@ -0,0 +1,41 @@
+import os
+
+from pixel_art_cache import ResultCache
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def test_runs_sharing_the_cache_keep_each_others_results(tmp_path):
+    directory = str(tmp_path / 'cache')
+    first, second = ResultCache(directory), ResultCache(directory)
+    for cache, name in ((first, 'a'), (second, 'b')):
+        write(tmp_path / f"{name}.png", name.encode())
+        write(tmp_path / f"{name}_pixel.png", name.encode() * 4)
+        key = cache.key(str(tmp_path / f"{name}.png"), str(tmp_path / f"{name}_pixel.png"), {'grid_size': 8})
+        cache.store(key, str(tmp_path / f"{name}_pixel.png"), (2, 2))
+
+    first.save()
+    second.save()
+
+    reopened = ResultCache(directory)
+    assert len(reopened.entries) == 2
+    for index, (key, entry) in enumerate(list(reopened.entries.items())):
+        assert os.path.exists(reopened.entry_path(key, entry['extension']))
+        assert reopened.fetch(key, str(tmp_path / f"out{index}.png")) == (2, 2)
+
+def test_eviction_deletes_the_evicted_files(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=6)
+    paths = []
+    for name in ('a', 'b'):
+        write(tmp_path / f"{name}.png", name.encode())
+        write(tmp_path / f"{name}_pixel.png", name.encode() * 4)
+        key = cache.key(str(tmp_path / f"{name}.png"), str(tmp_path / f"{name}_pixel.png"), {})
+        cache.store(key, str(tmp_path / f"{name}_pixel.png"), (2, 2))
+        paths.append(cache.entry_path(key, '.png'))
+    cache.entries[os.path.basename(paths[0])[:-4]]['used'] -= 10
+
+    cache.save()
+
+    assert not os.path.exists(paths[0])
+    assert os.path.exists(paths[1])
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from pixel_art_converter import collect_inputs, batch_jobs
+
+def touch(directory, *names):
+    for name in names:
+        with open(os.path.join(directory, name), 'wb'):
+            pass
+
+def test_directories_and_globs_skip_earlier_outputs(tmp_path):
+    touch(tmp_path, 'sprite.png', 'sprite_pixel.png', 'other.png', 'other_pixel.png')
+    expected = [str(tmp_path / 'other.png'), str(tmp_path / 'sprite.png')]
+    assert collect_inputs([str(tmp_path)], '_pixel') == expected
+    assert collect_inputs([str(tmp_path / '*.png')], '_pixel') == expected
+
+def test_glob_of_only_outputs_finds_nothing(tmp_path):
+    touch(tmp_path, 'sprite_pixel.png')
+    assert collect_inputs([str(tmp_path / '*.png')], '_pixel') == []
+    assert collect_inputs([str(tmp_path)], '_pixel') == []
+
+def test_explicit_files_are_kept(tmp_path):
+    touch(tmp_path, 'sprite_pixel.png')
+    assert collect_inputs([str(tmp_path / 'sprite_pixel.png')], '_pixel') == [str(tmp_path / 'sprite_pixel.png')]
+
+def test_shared_output_names_are_disambiguated(tmp_path):
+    jobs = batch_jobs([str(tmp_path / 'sprite.png'), str(tmp_path / 'sprite.jpg'), str(tmp_path / 'other.png')],
+                      None, '_pixel')
+    assert [os.path.basename(output_path) for _, output_path in jobs] == [
+        'sprite_png_pixel.png', 'sprite_jpg_pixel.png', 'other_pixel.png']
+
+def test_remaining_clash_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        batch_jobs([str(tmp_path / 'a' / 'sprite.png'), str(tmp_path / 'b' / 'sprite.png')], str(tmp_path / 'out'), '_pixel')
+
+def test_output_over_input_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        batch_jobs([str(tmp_path / 'sprite.png')], None, '')
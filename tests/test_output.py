@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from pixel_art_output import save_image
+
+def random_image(rng, mode, colors):
+    channels = len(mode)
+    palette = rng.integers(0, 256, (colors, channels), dtype=np.uint8)
+    if mode == 'RGBA':
+        palette[:, 3] = np.where(rng.random(colors) < 0.3, 0, 255)
+    height, width = (int(v) for v in rng.integers(1, 48, 2))
+    return Image.fromarray(palette[rng.integers(0, colors, (height, width))], mode)
+
+def visible(img_array):
+    # Pixels as shown: the color of fully transparent pixels does not count
+    img_array = np.array(img_array)
+    if img_array.shape[2] == 4:
+        img_array[img_array[..., 3] == 0] = 0
+    return img_array
+
+@pytest.mark.parametrize('seed', range(20))
+def test_gif_round_trip(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    mode = ('RGB', 'RGBA')[seed % 2]
+    image = random_image(rng, mode, int(rng.integers(1, 257)))
+    path = str(tmp_path / 'output.gif')
+    save_image(image, path, scale=2)
+    expected = np.repeat(np.repeat(visible(np.asarray(image)), 2, 0), 2, 1)
+    assert np.array_equal(visible(np.asarray(Image.open(path).convert(mode))), expected)
+
+def test_gif_refuses_what_it_cannot_hold(tmp_path):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path / 'output.gif')
+    with pytest.raises(ValueError):
+        save_image(Image.fromarray(rng.integers(0, 256, (40, 40, 3), dtype=np.uint8)), path)
+    with pytest.raises(ValueError):
+        save_image(Image.new('RGBA', (4, 4), (10, 20, 30, 128)), path)
+
+def qoi_case(rng, seed):
+    # Pixels built to hit every QOI chunk: runs (some past 62), repeats of
+    # earlier colors (index hits), small and luma-sized steps, and alpha changes
+    channels = (3, 4)[seed % 2]
+    count = int(rng.integers(1, 3000))
+    pixels = np.empty((count, 4), dtype=np.int32)
+    pixels[0] = rng.integers(0, 256, 4)
+    recent = [pixels[0]]
+    for i in range(1, count):
+        kind = rng.integers(0, 6)
+        previous = pixels[i - 1]
+        if kind == 0:
+            pixels[i] = previous
+        elif kind == 1:
+            pixels[i] = recent[int(rng.integers(0, len(recent)))]
+        elif kind == 2:
+            pixels[i] = previous + np.append(rng.integers(-2, 2, 3), 0)
+        elif kind == 3:
+            green = int(rng.integers(-32, 32))
+            pixels[i] = previous + np.array([green + int(rng.integers(-8, 8)), green, green + int(rng.integers(-8, 8)), 0])
+        elif kind == 4:
+            pixels[i] = np.append(rng.integers(0, 256, 3), previous[3])
+        else:
+            pixels[i] = rng.integers(0, 256, 4)
+        pixels[i] %= 256
+        recent = (recent + [pixels[i]])[-80:]
+    if seed % 3 == 0 and count > 2:
+        # Opaque black is the pixel before the first one, so a leading run of
+        # it is a run that never enters the index
+        run = int(rng.integers(1, min(100, count - 1)))
+        pixels[:run] = (0, 0, 0, 255)
+        pixels[run:run + 2] = ((1, 2, 3, 255), (0, 0, 0, 255))
+    elif rng.random() < 0.3:
+        # Long runs, including one at the very start
+        pixels[:int(rng.integers(0, count)) + 1] = pixels[0]
+    if channels == 3:
+        pixels[:, 3] = 255
+    width = int(rng.integers(1, 80))
+    height = -(-count // width)
+    pixels = np.resize(pixels, (height * width, 4))
+    return pixels.reshape(height, width, 4)[..., :channels].astype(np.uint8)
+
+@pytest.mark.parametrize('seed', range(60))
+def test_qoi_round_trip(tmp_path, seed):
+    img_array = qoi_case(np.random.default_rng(seed), seed)
+    image = Image.fromarray(img_array, ('RGB', 'RGBA')[img_array.shape[2] - 3])
+    path = str(tmp_path / 'output.qoi')
+    save_image(image, path)
+    with Image.open(path) as decoded:
+        assert decoded.mode == image.mode
+        assert np.array_equal(np.asarray(decoded), img_array)
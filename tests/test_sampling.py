@@ -0,0 +1,84 @@
+import math
+
+import numpy as np
+import pytest
+
+from pixel_art_sampling import sample_grid
+
+def baseline_center(img_array, grid_size, grid_offset_x, grid_offset_y):
+    # The per-pixel loop of the original convert_to_pixel_art, verbatim but
+    # for the names: whole-pixel square cells, one lookup at each center
+    img_height, img_width = img_array.shape[:2]
+    effective_width = img_width - grid_offset_x
+    effective_height = img_height - grid_offset_y
+    grid_cols = effective_width // grid_size
+    grid_rows = effective_height // grid_size
+    output_array = np.zeros((grid_rows, grid_cols, img_array.shape[2]), dtype=img_array.dtype)
+    for row in range(grid_rows):
+        for col in range(grid_cols):
+            center_x = grid_offset_x + col * grid_size + grid_size // 2
+            center_y = grid_offset_y + row * grid_size + grid_size // 2
+            center_x = min(center_x, img_width - 1)
+            center_y = min(center_y, img_height - 1)
+            output_array[row, col] = img_array[center_y, center_x]
+    return output_array
+
+def fractional_center(img_array, pitch_x, pitch_y, offset_x, offset_y):
+    # Not a regression: the original code had no fractional grids. This is the
+    # rule cell_centers documents, worked out one cell at a time, so the
+    # vectorized and banded paths are checked for consistency with it.
+    img_height, img_width = img_array.shape[:2]
+    grid_cols = max(0, int((img_width - offset_x + 0.5) // pitch_x))
+    grid_rows = max(0, int((img_height - offset_y + 0.5) // pitch_y))
+    output_array = np.zeros((grid_rows, grid_cols, img_array.shape[2]), dtype=img_array.dtype)
+    for row in range(grid_rows):
+        for col in range(grid_cols):
+            center_x = min(math.floor(offset_x + (col + 0.5) * pitch_x), img_width - 1)
+            center_y = min(math.floor(offset_y + (row + 0.5) * pitch_y), img_height - 1)
+            output_array[row, col] = img_array[center_y, center_x]
+    return output_array
+
+def random_image(rng, channels, min_size=1):
+    # Sizes are rarely multiples of the pitch, so most grids clip at the
+    # right and bottom edges
+    height, width = (int(v) for v in rng.integers(min_size, 160, 2))
+    return rng.integers(0, 256, (height, width, channels), dtype=np.uint8)
+
+@pytest.mark.parametrize('seed', range(200))
+def test_whole_pixel_grid_matches_baseline_loop(seed):
+    rng = np.random.default_rng(seed)
+    img_array = random_image(rng, (3, 4)[seed % 2], min_size=12)
+    grid_size = int(rng.integers(2, 17))
+    offset_x, offset_y = (int(v) for v in rng.integers(0, 12, 2))
+    expected = baseline_center(img_array, grid_size, offset_x, offset_y)
+    assert np.array_equal(sample_grid(img_array, grid_size, grid_size, offset_x, offset_y, 'center'), expected)
+
+@pytest.mark.parametrize('seed', range(200))
+def test_fractional_grid_is_consistent_with_cell_centers(seed):
+    rng = np.random.default_rng(1000 + seed)
+    img_array = random_image(rng, (3, 4)[seed % 2])
+    pitch_x, pitch_y = (round(float(v), 2) for v in rng.uniform(2, 16, 2))
+    offset_x, offset_y = (round(float(v), 2) for v in rng.uniform(0, 12, 2))
+    expected = fractional_center(img_array, pitch_x, pitch_y, offset_x, offset_y)
+    assert np.array_equal(sample_grid(img_array, pitch_x, pitch_y, offset_x, offset_y, 'center'), expected)
+
+@pytest.mark.parametrize('channels', (3, 4))
+@pytest.mark.parametrize('pitch, offset', ((3, 0), (3, 2), (7.5, 1.25), (10.67, 4.5)))
+def test_large_banded_grid(channels, pitch, offset):
+    # Over 10,000 cells and more rows than one band, with a progress callback
+    # so the banded path is taken; whole-pixel grids against the baseline
+    # loop, fractional ones against cell_centers
+    rng = np.random.default_rng(channels)
+    img_array = rng.integers(0, 256, (700, 330, channels), dtype=np.uint8)
+    fractions = []
+    output_array = sample_grid(img_array, pitch, pitch, offset, offset, 'center', fractions.append)
+    if isinstance(pitch, int):
+        expected = baseline_center(img_array, pitch, offset, offset)
+    else:
+        expected = fractional_center(img_array, pitch, pitch, offset, offset)
+    assert np.array_equal(output_array, expected)
+    assert fractions[-1] == 1.0
+
+def test_offset_beyond_image_gives_empty_grid():
+    img_array = np.zeros((10, 10, 3), dtype=np.uint8)
+    assert sample_grid(img_array, 4, 4, 12, 12, 'center').shape[:2] == (0, 0)
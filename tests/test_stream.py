@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from pixel_art_converter import load_image, convert_to_pixel_art, convert_file
+from pixel_art_stream import PngStripDecoder, open_strips, convert_file_streaming
+
+def source_image(mode, width=203, height=157):
+    # Smooth gradients under a noisy grid of 6x6 blocks, so the encoder picks
+    # a mix of row filters and every strip boundary lands on a different one
+    rng = np.random.default_rng(width * height)
+    y, x = np.mgrid[:height, :width]
+    blocks = rng.integers(0, 256, (height // 6 + 1, width // 6 + 1, 4), dtype=np.uint8)
+    blocks = np.repeat(np.repeat(blocks, 6, 0), 6, 1)[:height, :width]
+    gradient = np.stack([x * 255 // width, y * 255 // height, (x + y) % 256, 255 - x % 256], axis=2)
+    rgba = np.where(rng.random((height, width, 1)) < 0.5, blocks, gradient).astype(np.uint8)
+    image = Image.fromarray(rgba, 'RGBA')
+    if mode == 'P':
+        image = image.convert('RGB').quantize(16)
+        image.info['transparency'] = 3
+        return image
+    return image.convert(mode)
+
+PNG_MODES = ('RGB', 'RGBA', 'L', 'LA', 'P', '1')
+
+@pytest.mark.parametrize('mode', PNG_MODES)
+@pytest.mark.parametrize('sampling', ('center', 'mean'))
+@pytest.mark.parametrize('strip_rows', (1, 7, 64))
+def test_png_strips_match_in_memory_conversion(tmp_path, mode, sampling, strip_rows):
+    path = str(tmp_path / 'source.png')
+    source_image(mode).save(path)
+    decoder = open_strips(path)
+    decoder.close()
+    assert isinstance(decoder, PngStripDecoder)
+
+    for grid in ((4, 0, 0), (5.5, 1.5, 2.25)):
+        expected = convert_to_pixel_art(load_image(path), grid[0], grid[1], grid[2], sampling)
+        streamed = convert_file_streaming(path, grid[0], grid[1], grid[2], sampling, strip_rows=strip_rows)
+        assert streamed.mode == expected.mode
+        assert np.array_equal(np.asarray(streamed), np.asarray(expected))
+
+def test_low_bit_depth_png_matches_in_memory_conversion(tmp_path):
+    path = str(tmp_path / 'source.png')
+    source_image('RGB').quantize(4).save(path, bits=2)
+    expected = convert_to_pixel_art(load_image(path), 3)
+    streamed = convert_file_streaming(path, 3, strip_rows=5)
+    assert np.array_equal(np.asarray(streamed), np.asarray(expected))
+
+def test_other_formats_fall_back_to_in_memory(tmp_path):
+    path = str(tmp_path / 'source.bmp')
+    source_image('RGB').save(path)
+    expected = convert_to_pixel_art(load_image(path), 4, 1, 1, 'mean')
+    streamed = convert_file_streaming(path, 4, 1, 1, 'mean', strip_rows=9)
+    assert np.array_equal(np.asarray(streamed), np.asarray(expected))
+
+def test_png_over_the_decompression_bomb_limit_streams(tmp_path, monkeypatch):
+    path = str(tmp_path / 'source.png')
+    source_image('RGB', 120, 90).save(path)
+    expected = np.asarray(convert_to_pixel_art(load_image(path), 6))
+
+    # Pillow refuses images over twice the limit outright
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with pytest.raises(Image.DecompressionBombError):
+        load_image(path)
+    assert np.array_equal(np.asarray(convert_file_streaming(path, 6, strip_rows=16)), expected)
+    output_path = str(tmp_path / 'output.png')
+    assert convert_file(path, output_path, 6, strip_rows=16) == (20, 15)
+    assert Image.MAX_IMAGE_PIXELS == 1000
+    monkeypatch.undo()
+    assert np.array_equal(np.asarray(Image.open(output_path).convert('RGB')), expected)